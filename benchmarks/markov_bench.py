@@ -0,0 +1,166 @@
+"""Throughput and footprint of the markov_learning model at growing corpus sizes.
+
+    python -m benchmarks.markov_bench                      # compare with the checked-in baseline
+    python -m benchmarks.markov_bench --corpus chat.txt    # recorded corpus instead of synthetic
+    python -m benchmarks.markov_bench --save               # overwrite the baseline
+
+Every size runs in a fresh process, so peak RSS belongs to that size only. The synthetic
+corpus is seeded (Zipf-distributed words, varying sentence lengths); recorded corpora are
+read with the bulk trainer's readers and cycled when they are shorter than the size asked.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import tempfile
+import time
+from itertools import cycle, islice
+from multiprocessing import get_context
+
+import jieba
+import numpy as np
+
+from utils.markov import Markov
+from utils.markov.ingest import tokenize_message
+from utils.markov.train import read_messages
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(BENCH_DIR, "markov_baseline.json")
+SIZES = (1000, 10000, 100000)
+GEN_SAMPLES = 500
+CHOOSE_SAMPLES = 20000
+# Higher is better for these; lower for everything else
+HIGHER_IS_BETTER = ("ingest_msgs_per_s", "tokenize_msgs_per_s", "choose_per_s")
+
+
+def synthetic_corpus(size: int, vocab_size: int = 5000, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    words = ["".join(rng.choice("的一是不了人我在有他这中大来上个国到说们为子和你地出道也时年")
+                     for _ in range(rng.randint(1, 3))) for _ in range(vocab_size)]
+    weights = [1 / (rank + 1) for rank in range(vocab_size)]
+    return ["".join(rng.choices(words, weights, k=rng.randint(2, 20))) for _ in range(size)]
+
+
+def recorded_corpus(paths: list[str], size: int) -> list[str]:
+    messages = list(islice(read_messages(paths), size))
+    if not messages:
+        raise ValueError(f"no messages in {paths}")
+    return list(islice(cycle(messages), size))
+
+
+def disk_bytes(*paths: str) -> int:
+    total = 0
+    for path in paths:
+        if os.path.isfile(path):
+            total += os.path.getsize(path)
+        for root, _, files in os.walk(path):
+            total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+def run_size(size: int, corpus_paths: list[str] | None, gram: int) -> dict:
+    messages = recorded_corpus(corpus_paths, size) if corpus_paths else synthetic_corpus(size)
+    result = {"messages": size}
+    workdir = tempfile.mkdtemp(prefix="markov_bench_")
+    jieba.initialize()  # not part of the tokenize time
+    try:
+        started = time.perf_counter()
+        sentences = [tokenize_message(message) for message in messages]
+        result["tokenize_msgs_per_s"] = size / (time.perf_counter() - started)
+
+        machine = Markov(os.path.join(workdir, "shard"), gram=gram)
+        started = time.perf_counter()
+        for i in range(0, size, 64):  # the batches the plugin's ingestor applies
+            machine.update_batch([sentence for message in sentences[i:i + 64] for sentence in message])
+        machine.flush()
+        result["ingest_msgs_per_s"] = size / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        machine.compact()
+        result["compact_s"] = time.perf_counter() - started
+
+        states = [tuple(machine.vocab[int(id)] for id in state) for state in machine.table.states[:1000]]
+        started = time.perf_counter()
+        for i in range(CHOOSE_SAMPLES):
+            machine.random_choose_weighted(states[i % len(states)])
+        result["choose_per_s"] = CHOOSE_SAMPLES / (time.perf_counter() - started)
+
+        latencies = []
+        keywords = [machine.vocab[id] for id in range(2, min(len(machine.vocab), 200))]
+        for i in range(GEN_SAMPLES):
+            ctx = [keywords[i % len(keywords)]] if i % 2 and keywords else None
+            started = time.perf_counter()
+            machine.gen(ctx)
+            latencies.append(time.perf_counter() - started)
+        result["gen_p50_ms"] = float(np.percentile(latencies, 50)) * 1000
+        result["gen_p99_ms"] = float(np.percentile(latencies, 99)) * 1000
+
+        result["disk_bytes"] = disk_bytes(machine.snapshot_dir, machine.journal.path)
+        result["peak_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def run(sizes: list[int], corpus_paths: list[str] | None, gram: int) -> list[dict]:
+    results = []
+    with get_context("spawn").Pool(1, maxtasksperchild=1) as pool:
+        for size in sizes:
+            results.append(pool.apply(run_size, (size, corpus_paths, gram)))
+            print(format_result(results[-1]))
+    return results
+
+
+def format_result(result: dict) -> str:
+    return f"{result['messages']:>8} msgs | ingest {result['ingest_msgs_per_s']:9.0f} msg/s | " \
+        f"tokenize {result['tokenize_msgs_per_s']:7.0f} msg/s | choose {result['choose_per_s']:8.0f}/s | " \
+        f"gen p50 {result['gen_p50_ms']:6.2f}ms p99 {result['gen_p99_ms']:6.2f}ms | " \
+        f"compact {result['compact_s']:5.2f}s | rss {result['peak_rss_bytes'] / 2 ** 20:6.0f}MiB | " \
+        f"disk {result['disk_bytes'] / 2 ** 20:6.1f}MiB"
+
+
+def compare(results: list[dict], baseline: list[dict]):
+    """Print each metric relative to the baseline run of the same size (>1.00x is better)."""
+    by_size = {result["messages"]: result for result in baseline}
+    for result in results:
+        base = by_size.get(result["messages"])
+        if base is None:
+            continue
+        ratios = []
+        for metric, value in result.items():
+            if metric == "messages" or not base.get(metric) or not value:
+                continue
+            ratio = value / base[metric] if metric in HIGHER_IS_BETTER else base[metric] / value
+            ratios.append(f"{metric} {ratio:.2f}x")
+        print(f"{result['messages']:>8} msgs vs baseline: " + ", ".join(ratios))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the markov_learning model.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), help="corpus sizes in messages")
+    parser.add_argument("--corpus", nargs="+", default=None, help="recorded chat exports (.txt/.json)")
+    parser.add_argument("--gram", type=int, default=2)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.corpus, args.gram)
+    if args.save:
+        with open(args.baseline, "w", encoding="utf8") as f:
+            json.dump({"corpus": args.corpus or "synthetic", "gram": args.gram,
+                       "machine": f"{platform.machine()} x{os.cpu_count()}, Python {platform.python_version()}",
+                       "results": results}, f, indent=2)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf8") as f:
+            baseline = json.load(f)
+        if baseline["gram"] == args.gram and baseline["corpus"] == (args.corpus or "synthetic"):
+            compare(results, baseline["results"])
+        else:
+            print(f"baseline '{args.baseline}' was recorded with another corpus or gram, not comparing")
+
+
+if __name__ == "__main__":
+    main()
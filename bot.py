@@ -6,35 +6,37 @@
 #TODO: recapture of drawbacked messages
 import asyncio
 import multiprocessing
-
-import nonebot
 import sqlite3
 import time
-#from nonebot.adapters.telegram import Adapter as TELEGRAMAdapter
-from nonebot.adapters.onebot.v11 import Adapter as ONEBOT_V11Adapter
 
-#from nonebot.adapters.console import Adapter as CONSOLEAdapter
+# Card render workers are spawned and re-import this module as __mp_main__, so the bot
+# is only set up below: a worker must not boot another bot with every plugin.
+if __name__ == "__main__":
+    import nonebot
+    #from nonebot.adapters.telegram import Adapter as TELEGRAMAdapter
+    from nonebot.adapters.onebot.v11 import Adapter as ONEBOT_V11Adapter
+
+    #from nonebot.adapters.console import Adapter as CONSOLEAdapter
 
-# from nonebot.adapters.spigot import Adapter as SPIGOTAdapter
+    # from nonebot.adapters.spigot import Adapter as SPIGOTAdapter
 
 
-nonebot.init()
+    nonebot.init()
 
-driver = nonebot.get_driver()
-#driver.register_adapter(TELEGRAMAdapter)
+    driver = nonebot.get_driver()
+    #driver.register_adapter(TELEGRAMAdapter)
 
-driver.register_adapter(ONEBOT_V11Adapter)
+    driver.register_adapter(ONEBOT_V11Adapter)
 
-#driver.register_adapter(CONSOLEAdapter)
+    #driver.register_adapter(CONSOLEAdapter)
 
-# driver.register_adapter(SPIGOTAdapter)
+    # driver.register_adapter(SPIGOTAdapter)
 
-# nonebot.load_builtin_plugins('echo')
-nonebot.load_plugins('./plugins')
+    # nonebot.load_builtin_plugins('echo')
+    nonebot.load_plugins('./plugins')
 
-nonebot.load_from_toml("pyproject.toml")
+    nonebot.load_from_toml("pyproject.toml")
 
-if __name__ == "__main__":
     from plugins.apexlegends import init_track, fetch_current_rankscore, apexbind_infos,CUR_SEASON, CUR_SPLIT, PERIOD_KEY, DATABASE_FILE
     async def _track_apex_data(): #TODO: Refactor it into a separated module to handle apex updates
         print(":)")
@@ -3,7 +3,7 @@ import asyncio
 from functools import lru_cache, wraps
 from typing import Any
 from nonebot.rule import to_me
-from nonebot.adapters.onebot.v11 import Event, Message, PrivateMessageEvent, MessageSegment
+from nonebot.adapters.onebot.v11 import Event, Message, PrivateMessageEvent
 from nonebot.matcher import Matcher
 from nonebot.params import Arg, CommandArg, ArgPlainText, EventMessage
 from nonebot.plugin import on_command
@@ -29,16 +29,22 @@ import aiohttp
 import time
 import sqlite3
 
-from utils.image_utils import random_str
+from utils.image_utils import CardEncoding, asset_fetcher, fetch_legend_avatar, fetch_rank_logo
+from utils.render_pool import render_pool
+from utils.card_send import send_card
 
-global_config = get_driver().config
+from .config import Config
+
+driver = get_driver()
+global_config = driver.config
+config = Config.parse_obj(global_config)
 
 BINDED_USER_FILE = os.path.join(PLUGIN_DIR, 'binded.json')
 API_KEY = global_config.apex_key
 CUR_SEASON = global_config.season
 CUR_SPLIT = global_config.split
 PERIOD_KEY = f"s{CUR_SEASON}s{CUR_SPLIT}"
-IMAGE_TMP_PATH = "/tmp"
+CARD_ENCODING = CardEncoding(config.apex_card_format, config.apex_card_max_width, config.apex_card_quality)
 
 apexbind_infos:dict[str, Any] = { # TODO: make it a class with (de)serialize methods
     "users":{},
@@ -147,6 +153,19 @@ async def fetch_legend_played(uid: int, season: int):
                 res[legend["name"]] = 0 if not non_zero_values else non_zero_values[0]
             return sorted(res.items(), key=lambda x: x[1], reverse=True)
             
+@driver.on_startup
+async def prefetch_assets():
+    async def prefetch():
+        present = await qq_image.prefetch_apex_assets()
+        print(f"apex: {present} legend avatars and rank logos available")
+        render_pool.start()  # workers warm up with the assets just fetched
+    asyncio.create_task(prefetch())
+
+@driver.on_shutdown
+async def close_asset_fetcher():
+    await asset_fetcher.close()
+    render_pool.shutdown()
+
 apex_list = on_command("apex_list", rule=lambda: True,
                        aliases={"apex列表", "apex_list"})
 apex_user = on_command("apex_user", rule=lambda: True,
@@ -238,13 +257,11 @@ async def handle_stat(matcher: Matcher, struid: str = ArgPlainText("uid")):
     dbcursor.execute("SELECT score FROM data WHERE season=? AND split=? AND uid=?", (CUR_SEASON, CUR_SPLIT, uid))
     result = dbcursor.fetchall()
     scores = list(map(lambda x:x[0], result))
-    image = qq_image.handlers['apex'](info, top3, scores)
-    image_path = f"{IMAGE_TMP_PATH}/tmp_{random_str(6)}.png"
-    try:
-        image.save(image_path) #TODO: using a context manager to delete tmp file
-        await matcher.send(MessageSegment.image("file://" + image_path))
-    finally:
-        os.remove(image_path)
+    # The renderer only reads local files, so fetch whatever is still missing first
+    rank_logo_name = qq_image.apex_rank_logo_name(info)
+    await asyncio.gather(*([fetch_rank_logo(rank_logo_name)] if rank_logo_name else []),
+                         *(fetch_legend_avatar(legend) for legend in top3))
+    await send_card(matcher, 'apex', info, top3, scores, encoding=CARD_ENCODING, failure="名片生成失败，稍后再试试吧")
 
 @apex_add.handle()
 async def handle_add_first(matcher: Matcher, arg: Message = CommandArg()):
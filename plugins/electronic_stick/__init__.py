@@ -2,6 +2,7 @@
 # 资源来自：https://github.com/DSP-8192/HuoZiYinShua
 # TODO: 原声大碟替换常见短语
 from time import sleep
+import asyncio
 from nonebot import get_driver
 from nonebot.rule import to_me
 from nonebot.params import EventPlainText, CommandArg, ArgPlainText
@@ -9,23 +10,39 @@ from nonebot.matcher import Matcher
 from nonebot.adapters.onebot.v11 import Event, Message, MessageSegment
 from nonebot.plugin import on_command
 from nonebot.typing import T_State
-import pypinyin
-from pydub import AudioSegment
 import os
-import random
-import string
-import re
+from concurrent.futures import ThreadPoolExecutor
+from utils.huozi import SampleBank, assemble
+from utils.huozi.transform import PhraseMatcher, PHRASE
+from utils.huozi.pinyin_table import PinyinTable
+from utils.huozi.encode import encode, encoder_available
+from utils.huozi.cache import ClipCache, clip_key
 
 from .config import Config
 
-global_config = get_driver().config
+driver = get_driver()
+global_config = driver.config
 config = Config.parse_obj(global_config)
 
 PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
 
 WORD_WAV_PATH = os.path.join(PLUGIN_DIR, "sources")
 PHRASE_WAV_PATH = os.path.join(PLUGIN_DIR, "special_sources")
-_TRANSFORM_MAP = { #FIXME: alpha replacement intercept special phrases
+# Decoded once into memory, at startup or on first use
+word_bank = SampleBank(WORD_WAV_PATH, config.diangun_sample_rate)
+phrase_bank = SampleBank(PHRASE_WAV_PATH, config.diangun_sample_rate)
+# Generated from sources/ by `python -m utils.huozi.pinyin_table`, rebuild it after adding samples
+PINYIN_TABLE_PATH = os.path.join(PLUGIN_DIR, "pinyin_table.json")
+pinyin_table = PinyinTable.load(PINYIN_TABLE_PATH)
+if not encoder_available(config.diangun_format):
+    print(f"WARN: no {config.diangun_format} encoder available, 活字印刷 falls back to wav")
+# Finished clips by input, so repeated phrases are answered without synthesis
+clip_cache = ClipCache(config.diangun_cache_bytes,
+                       os.path.join(PLUGIN_DIR, config.diangun_disk_cache_dir) if config.diangun_disk_cache_dir
+                       else None,
+                       config.diangun_disk_cache_bytes)
+# Longest match wins, so letters never cut into phrases such as "aq1"
+TRANSFORM_MAP = {
     "a": "诶",
     "b": "比",
     "c": "西",
@@ -106,16 +123,24 @@ _TRANSFORM_MAP = { #FIXME: alpha replacement intercept special phrases
     "。": "$$",
 
 }
-TRANSFORM_MAP_LIST = sorted(_TRANSFORM_MAP.items(), key=lambda item: len(
-    item[0]) if not item[1].startswith('$') else 10000000)
-TRANSFORM_MAP = {ele[0]: ele[1] for ele in TRANSFORM_MAP_LIST}
-# print(TRANSFORM_MAP)
+phrase_matcher = PhraseMatcher(TRANSFORM_MAP)
 
 
-def random_str(length):
-    """Generate random a string consists with a-zA-z0-9 with a given length"""
-    letters = string.ascii_lowercase + string.ascii_uppercase + string.digits
-    return ''.join(random.choice(letters) for _ in range(length))
+# Synthesis runs here so that a long clip never blocks the event loop
+synth_executor = ThreadPoolExecutor(max_workers=config.diangun_workers, thread_name_prefix="diangun")
+user_jobs: dict[str, int] = {}  # queued or running jobs per user, only touched on the event loop
+
+
+@driver.on_startup
+async def load_banks():
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(loop.run_in_executor(synth_executor, word_bank.load),
+                         loop.run_in_executor(synth_executor, phrase_bank.load))
+
+
+@driver.on_shutdown
+async def stop_synthesis():
+    synth_executor.shutdown(wait=False, cancel_futures=True)
 
 
 diangun = on_command("大家好啊", rule=lambda: True, aliases={"diangun", "活字印刷"})
@@ -129,37 +154,69 @@ async def handle_diangun(state: T_State, matcher: Matcher, arg: Message = Comman
         matcher.set_arg("word", Message(arg))
 
 
+def synthesize(word: str, start_init: bool) -> bytes:
+    """Encoded voice clip of `word` (already lowercased), preceded by 大家好啊 if `start_init`."""
+    pieces = [phrase_bank["djha"]] if start_init else []
+    for kind, value in phrase_matcher.tokens(word):
+        if kind == PHRASE:
+            if not value:
+                pieces.append(phrase_bank.frames(200))
+            elif value in phrase_bank:
+                pieces.append(phrase_bank[value])
+            else:
+                print(f"WARN: missing phrase sample '{value}'")
+            continue
+        for pinyin in pinyin_table.read(value):
+            if pinyin in word_bank:  # skips punctuation, digits and syllables without a sample
+                pieces.append(word_bank[pinyin])
+    pieces.append(word_bank.frames(200))
+    samples = assemble(pieces, crossfade=word_bank.frames(config.diangun_crossfade_ms),
+                       gap=word_bank.frames(config.diangun_gap_ms), min_frames=word_bank.frames(1000))
+    data, _ = encode(samples, word_bank.sample_rate, config.diangun_format,
+                     config.diangun_output_rate, config.diangun_bitrate)
+    return data
+
+
+def cache_key(word: str, start_init: bool) -> str:
+    return clip_key(word, start_init, config.diangun_format, config.diangun_output_rate,
+                    config.diangun_bitrate, config.diangun_gap_ms, config.diangun_crossfade_ms)
+
+
+def render(key: str, word: str, start_init: bool) -> bytes:
+    data = clip_cache.get(key)
+    if data is None:
+        data = synthesize(word, start_init)
+        clip_cache.put(key, data)
+    return data
+
+
+def release_job(user: str):
+    user_jobs[user] -= 1
+    if not user_jobs[user]:
+        del user_jobs[user]
+
+
 @diangun.got("word", prompt="你要鬼叫什么？")
-async def gen_diangun(state: T_State, matcher: Matcher, word: str = ArgPlainText("word")):
+async def gen_diangun(state: T_State, matcher: Matcher, event: Event, word: str = ArgPlainText("word")):
     word = word.lower()
-    for k, v in TRANSFORM_MAP.items():
-        word = word.replace(k, v)
-    pinyins = pypinyin.lazy_pinyin(word)
-    sound_data = AudioSegment.from_wav(
-        f"{PHRASE_WAV_PATH}/djha.wav") if state["start_init"] else AudioSegment.empty()
-    # print(word, pinyins)
-    for pinyin in pinyins:
-        pattern = r"\$(.*?)\$"
-        matches = re.findall(pattern, pinyin)
-        try:
-            # print(matches)
-            if matches:
-                for special in matches:
-                    sound_data += AudioSegment.from_wav(
-                        f"{PHRASE_WAV_PATH}/{special}.wav") if special else AudioSegment.silent(duration=200)
-            elif pinyin.islower() and pinyin.isalpha():
-                sound_data += AudioSegment.from_wav(
-                    f"{WORD_WAV_PATH}/{pinyin}.wav")
-        except Exception as e:
-            print(e)
-            continue
-    sound_data += AudioSegment.silent(duration=200)
-    if len(sound_data) < 1000:
-        sound_data += AudioSegment.silent(duration=1000)
-    tmp_file_path = f"/tmp/tmp_{random_str(6)}.wav"
-    sound_data.export(tmp_file_path, format="wav")
-    with open(tmp_file_path, "rb") as f:
-        await matcher.send(MessageSegment.record(file=f.read()))
-    # await matcher.send(MessageSegment.record(file=f.read()))
-    # FIXME: I don't know why cqhttp respond "file not exist" when using file path as a arg
-    os.remove(tmp_file_path)
+    if len(word) > config.diangun_max_length:
+        await matcher.finish(f"太长了，最多鬼叫{config.diangun_max_length}个字")
+    # Clips still in memory are answered right away, without queueing behind syntheses
+    key = cache_key(word, state["start_init"])
+    data = clip_cache.get_memory(key)
+    if data is not None:
+        await matcher.finish(MessageSegment.record(file=data))
+    user = event.get_user_id()
+    if user_jobs.get(user, 0) >= config.diangun_user_concurrency:
+        await matcher.finish("上一句还没叫完呢")
+    if sum(user_jobs.values()) >= config.diangun_workers + config.diangun_queue_size:
+        await matcher.finish("叫不过来了，待会再试")
+    # A job holds its slots until the worker is really done, even after the timeout below
+    future = asyncio.get_running_loop().run_in_executor(synth_executor, render, key, word, state["start_init"])
+    user_jobs[user] = user_jobs.get(user, 0) + 1
+    future.add_done_callback(lambda _: release_job(user))
+    try:
+        data = await asyncio.wait_for(asyncio.shield(future), config.diangun_timeout)
+    except asyncio.TimeoutError:
+        await matcher.finish("叫得太久，嗓子哑了")
+    await matcher.send(MessageSegment.record(file=data))  # bytes go out as base64://
@@ -3,3 +3,21 @@ from pydantic import BaseModel, Extra
 
 class Config(BaseModel, extra=Extra.ignore):
     """Plugin Config Here"""
+    diangun_sample_rate: int = 44100  # every sample is resampled to this, in mono
+    # Between two consecutive samples: a silent gap, or without one an overlapping crossfade
+    diangun_gap_ms: float = 0.0
+    diangun_crossfade_ms: float = 0.0
+    # Voice output: wav, silk (needs silk-python), ogg/opus, mp3 or amr (need ffmpeg)
+    diangun_format: str = "wav"
+    diangun_output_rate: int = 24000  # Hz, mono; amr is always 8000
+    diangun_bitrate: int = 32000  # bits/s of compressed formats
+    # Finished clips are cached by input; the disk tier is off unless a directory is given
+    diangun_cache_bytes: int = 32 * 1024 * 1024
+    diangun_disk_cache_dir: str = ""  # relative to the plugin directory
+    diangun_disk_cache_bytes: int = 256 * 1024 * 1024
+    # Synthesis runs in worker threads; requests beyond the queue are turned away
+    diangun_workers: int = 2
+    diangun_queue_size: int = 8  # jobs waiting for a worker
+    diangun_user_concurrency: int = 1  # queued or running jobs per user
+    diangun_timeout: float = 10.0  # seconds until the handler gives up on a clip
+    diangun_max_length: int = 200  # characters of input
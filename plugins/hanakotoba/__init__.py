@@ -3,7 +3,7 @@ from nonebot import get_driver
 # from nonebot.rule import to_me
 from nonebot.params import CommandArg, RawCommand
 from nonebot.matcher import Matcher
-from nonebot.adapters.onebot.v11 import Message, MessageSegment
+from nonebot.adapters.onebot.v11 import Message
 from nonebot.plugin import on_command
 import datetime
 from time import strftime
@@ -11,16 +11,17 @@ from functools import lru_cache
 from typing import Optional
 import os
 import json
-import string
 import random
 from utils import qq_image
+from utils.image_utils import CardEncoding
+from utils.card_send import send_card
 
 from .config import Config
 
 global_config = get_driver().config
 config = Config.parse_obj(global_config)
 PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
-IMAGE_TMP_PATH = "/tmp"
+CARD_ENCODING = CardEncoding(config.hnktb_card_format, config.hnktb_card_max_width, config.hnktb_card_quality)
 
 OLD_FLOWER_DICT = {  # deprecated?
     "アイビー": "公正と信頼",
@@ -307,12 +308,6 @@ OLD_FLOWER_DICT = {  # deprecated?
 }
 
 
-def random_str(length):  # FIXME: duplicated, moved to help_func.py
-    """Generate random a string consists with a-zA-z0-9 with a given length"""
-    letters = string.ascii_lowercase + string.ascii_uppercase + string.digits
-    return ''.join(random.choice(letters) for _ in range(length))
-
-
 @dataclass
 class Flower:
     image: str | bytes = ""
@@ -356,7 +351,9 @@ async def handle_hnktb(matcher: Matcher, arg: Message = CommandArg(), command =
     else:
         index = day_hash() if "今日" in command else random.randint(0, len(FLOWERS)-1)
         today_flower = FLOWERS.get(list(FLOWERS.keys())[index % len(FLOWERS)], Flower())
-        image = qq_image.handlers['hanakotoba'](
+        await send_card(
+            matcher,
+            'hanakotoba',
             image=today_flower.image,
             kotobas=today_flower.kotoba,
             name=today_flower.name,
@@ -364,16 +361,12 @@ async def handle_hnktb(matcher: Matcher, arg: Message = CommandArg(), command =
             show_if_exist(today_flower.birthday, "誕生日{}の花\n") +
             show_if_exist(today_flower.period, "開花期：{}\n") +
             show_if_exist(today_flower.familia, "科名：{}\n") +
-            show_if_exist(today_flower.desc, "{}"))
+            show_if_exist(today_flower.desc, "{}"),
+            encoding=CARD_ENCODING)
         # today_hash = day_hash()
         # today_flower = list(OLD_FLOWER_DICT.keys())[
         #     today_hash % len(OLD_FLOWER_DICT)]
         # send_text = f"今日花语\n{today_flower}:{OLD_FLOWER_DICT.get(today_flower)}"
-        image_path = f"{IMAGE_TMP_PATH}/tmp_{random_str(6)}.png"
-        # TODO: using a context manager to delete tmp file
-        image.save(image_path)
-        await matcher.send(MessageSegment.image("file://" + image_path))
-        os.remove(image_path)
         return
     send_text = str(send_text)
     await hnktb.send(message=send_text)
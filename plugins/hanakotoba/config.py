@@ -3,3 +3,7 @@ from pydantic import BaseModel, Extra
 
 class Config(BaseModel, extra=Extra.ignore):
     """Plugin Config Here"""
+    # Flower cards are sent as png (lossless), png8 (palette), jpeg or webp
+    hnktb_card_format: str = "jpeg"
+    hnktb_card_max_width: int = 1280  # px, wider cards are scaled down first
+    hnktb_card_quality: int = 85  # jpeg and webp
@@ -1,24 +1,29 @@
-import random
-from typing import Optional, Iterator, Callable
+import asyncio
+import multiprocessing
+import time
 from nonebot import get_driver
 from nonebot.params import EventPlainText, CommandArg
 from nonebot.matcher import Matcher
 from nonebot.plugin import on_command, on_message
 from nonebot.permission import Permission
 from nonebot.adapters.onebot.v11 import Event, Message, GroupMessageEvent, PrivateMessageEvent
-import pickle
 import os
-import re
-import jieba
-from copy import copy
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from utils.markov import Markov, ShardManager
+from utils.markov.ingest import Ingestor, init_worker, tokenize_words
 
-PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
-DIAGRAM_SAVE = os.path.join(PLUGIN_DIR, 'diagram.cache')
-
-EOS = "<eos>"
-BOS = "<bos>"
+from .config import Config
 
-global_config = get_driver().config
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+SHARDS_DIR = os.path.join(PLUGIN_DIR, 'shards')
+GLOBAL_SHARD = "global"
+# Single global model of older versions (pickled), imported into the global shard
+DIAGRAM_LEGACY = os.path.join(PLUGIN_DIR, 'diagram.cache')
+
+driver = get_driver()
+global_config = driver.config
+config = Config.parse_obj(global_config)
 TRACKING_GROUPS = global_config.tracking_groups
 print("tracking:"+str(TRACKING_GROUPS))
 
@@ -35,72 +40,56 @@ async def private_checker(event: Event) -> bool:
     return isinstance(event, PrivateMessageEvent)
 
 
-class Markov(object):
-    def __init__(self):
-        self.gram = 2
-        self.trans: dict[tuple, dict[str, int]] = {}
-        self.trans[tuple([BOS for _ in range(self.gram)])] = {EOS: 1}
-        try:
-            with open(DIAGRAM_SAVE, "rb") as f:
-                self.trans |= pickle.load(file=f)
-        except:
-            pass
-        # print(self.trans)
-
-    def increase(self, key: tuple, value: str):
-        times = self.trans.setdefault(key, {}).setdefault(value, 0)
-        self.trans[key][value] = times + 1
-
-    def update(self, sentence: list):
-        sentence = [*[BOS for _ in range(self.gram)], *list(sentence), EOS]
-        for i in range(len(sentence) - self.gram):
-            self.increase(
-                tuple(sentence[i:i+self.gram]), sentence[i+self.gram])
-
-    def cache_machine(self):
-        with open(DIAGRAM_SAVE, "wb") as f:
-            pickle.dump(self.trans, file=f)
-
-    def random_choose_weighted(self, key: tuple):
-        # try:
-        tot = sum(self.trans.setdefault(key, {}).values())
-        weight = tuple(
-            elem/tot for elem in self.trans.setdefault(key, {}).values())
-        if len(weight) == 0:
-            return None
-        return random.choices(list(self.trans.setdefault(key, {}).keys()), weights=weight, k=1)[0]
-        # except TypeError as e:
-        #     print(key)
-
-    def gen(self, ctx:Optional[tuple|list]=None):
-        if not ctx:
-            state:tuple = tuple([BOS for _ in range(self.gram)])
-            output = []
-        else:
-            ctx = list(ctx)
-            output = copy(ctx)
-            ctx = ctx[-self.gram:]
-            state = tuple([*[BOS for _ in range(self.gram-len(ctx))], *ctx])
-            print(f"state:{state}")
-        while True:
-            gen = self.random_choose_weighted(tuple(state))
-            if gen == None:
-                state = tuple([BOS for _ in range(self.gram)])
-                continue
-            if gen == BOS:
-                pass
-            elif gen == EOS:
-                pass
-                # output += "。"
-            else:
-                output += gen
-            state = tuple([*state[1:], gen])
-            if gen == EOS:
-                break
-        return "".join(output)
+shards = ShardManager(SHARDS_DIR, config.markov_memory_budget, gram=config.markov_gram,
+                      flush_interval=config.markov_flush_interval, flush_size=config.markov_flush_size)
+if not os.path.exists(shards.path(GLOBAL_SHARD)) and os.path.exists(DIAGRAM_LEGACY):
+    Markov(shards.path(GLOBAL_SHARD), gram=config.markov_gram, legacy_path=DIAGRAM_LEGACY).compact()
+
+
+def shard_keys(event: Event) -> list[str]:
+    """Shards a message feeds: its group's own, plus the global blend."""
+    if not isinstance(event, GroupMessageEvent):
+        return [GLOBAL_SHARD]
+    keys = [str(event.group_id)]
+    if config.markov_global_blend:
+        keys.append(GLOBAL_SHARD)
+    return keys
+
+
+# Every read and write of the models happens on this single thread, so generation can
+# run off the event loop without racing updates, compaction or eviction.
+model_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="markov")
+
+
+async def run_model(func, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(model_executor, partial(func, *args, **kwargs))
 
 
-machine = Markov()
+def apply_sentences(key: str, sentences: list[list[str]]):
+    shards.get(key).update_batch(sentences)
+
+
+def generate(key: str, ctx: list[str] | None) -> str:
+    return shards.get(key).gen(ctx=ctx, max_tokens=config.markov_max_tokens,
+                               time_budget=config.markov_gen_timeout / 2)
+
+
+ingestor = Ingestor(apply_sentences,
+                    ProcessPoolExecutor(max_workers=config.markov_ingest_workers, initializer=init_worker,
+                                        mp_context=multiprocessing.get_context("spawn")),
+                    queue_size=config.markov_ingest_queue_size,
+                    batch_size=config.markov_ingest_batch_size,
+                    cache_size=config.markov_token_cache_size,
+                    apply_executor=model_executor)
+
+
+async def seeded_generate(key: str, arg_txt: str) -> str:
+    """Tokenize the seed in the ingest pool (jieba is only loaded there), then generate."""
+    ctx = None
+    if arg_txt != "" and arg_txt != " ":
+        ctx = await asyncio.get_running_loop().run_in_executor(ingestor.executor, tokenize_words, arg_txt)
+    return await run_model(generate, key, ctx)
+
 
 markov = on_command("歪诗", permission=Permission(
     tracked_group_checker) | Permission(private_checker), priority=1)
@@ -109,26 +98,78 @@ group_message = on_message(permission=Permission(
 
 
 @markov.handle()
-async def handle_markov(matcher: Matcher, arg: Message = CommandArg()):
+async def handle_markov(matcher: Matcher, event: Event, arg: Message = CommandArg()):
     arg_txt = arg.extract_plain_text()
     # print(f"argt:{arg_txt}")
-    message = machine.gen(ctx=None if arg_txt ==
-                          "" or arg_txt == " " else jieba.lcut(arg_txt))
+    try:
+        message = await asyncio.wait_for(seeded_generate(shard_keys(event)[0], arg_txt),
+                                         config.markov_gen_timeout)
+    except asyncio.TimeoutError:  # queued behind a compaction
+        message = "歪宝一时语塞……"
     await matcher.send(message)
     matcher.stop_propagation()
 
 
 @group_message.handle()
 async def handle_group(matcher: Matcher, event: Event, plain: str = EventPlainText()):
-    plain = re.sub(r"\[.*?\]", "", plain)  # remove CQ Code
-    plain = re.sub(r"&#[0-9]{1,3};", "", plain)  # remove escaped symbols
-    plain = plain.replace("\u3000", "").replace("\r", "")
-    segments = plain.split("\n")
-    for segment in segments:
-        raw_sentences = re.split(r"\.|。|\?|!|？|！", segment, flags=re.UNICODE)
-        for raw_sentence in raw_sentences:
-            if raw_sentence == "" or raw_sentence == " ":
-                continue
-            token_list = jieba.lcut(raw_sentence)
-            machine.update(token_list)
-    machine.cache_machine()
+    await ingestor.submit(shard_keys(event), plain)
+
+
+def persist_shards():
+    for key, machine in shards:
+        try:
+            if machine.should_compact(config.markov_compact_interval, config.markov_compact_journal_bytes):
+                machine.compact()
+            else:
+                machine.flush()
+        except Exception as e:
+            print(f"WARN: failed to persist markov shard '{key}': {e}")
+    evicted = shards.evict()
+    if evicted:
+        print(f"markov: evicted shards {evicted}")
+
+
+async def persist_machine():
+    """Flush journal batches on a timer, fold them into the snapshot occasionally."""
+    while True:
+        await asyncio.sleep(config.markov_flush_interval)
+        await run_model(persist_shards)
+
+
+def maintain_next_shard():
+    """Maintain the shard that went longest without it, if it is due."""
+    keys = shards.keys()
+    if not keys:
+        return
+    maintained_at, key = min((shards.maintained_at(key), key) for key in keys)
+    if time.time() - maintained_at < config.markov_maintain_interval:
+        return
+    try:
+        report = shards.get(key).maintain(half_life=config.markov_half_life_days * 24 * 3600,
+                                          threshold=config.markov_prune_threshold,
+                                          max_states=config.markov_max_states,
+                                          max_bytes=config.markov_max_bytes)
+        print(f"markov: maintained shard '{key}': {report}")
+    except Exception as e:
+        print(f"WARN: failed to maintain markov shard '{key}': {e}")
+
+
+async def maintain_machine():
+    """Decay and prune one shard at a time so generation is never blocked for long."""
+    while True:
+        await asyncio.sleep(config.markov_flush_interval)
+        await run_model(maintain_next_shard)
+
+
+@driver.on_startup
+async def start_persisting():
+    asyncio.create_task(ingestor.run())
+    asyncio.create_task(persist_machine())
+    asyncio.create_task(maintain_machine())
+
+
+@driver.on_shutdown
+async def stop_persisting():
+    ingestor.shutdown()
+    await run_model(shards.flush)
+    model_executor.shutdown()
@@ -3,3 +3,26 @@ from pydantic import BaseModel, Extra
 
 class Config(BaseModel, extra=Extra.ignore):
     """Plugin Config Here"""
+    markov_gram: int = 2  # tokens of context per state
+    markov_max_tokens: int = 64  # per generated sentence
+    markov_gen_timeout: float = 2.0  # seconds until /歪诗 answers no matter what
+    # Every tracked group gets its own model; this also feeds all of them into the global one
+    markov_global_blend: bool = True
+    markov_memory_budget: int = 512 * 1024 * 1024  # bytes of resident models before LRU eviction
+    # Journal deltas are appended when either threshold is hit
+    markov_flush_interval: float = 5.0  # seconds
+    markov_flush_size: int = 1000  # buffered transitions
+    # The journal is folded into the snapshot when either threshold is hit
+    markov_compact_interval: float = 3600.0  # seconds
+    markov_compact_journal_bytes: int = 32 * 1024 * 1024
+    # Tokenization of tracked messages happens in worker processes
+    markov_ingest_workers: int = 1
+    markov_ingest_queue_size: int = 1000  # pending messages before handlers wait
+    markov_ingest_batch_size: int = 64
+    markov_token_cache_size: int = 4096  # distinct recent messages whose tokens are reused
+    # Maintenance decays counts, drops rare transitions and trims each shard to its budget
+    markov_maintain_interval: float = 24 * 3600.0  # seconds between maintenance runs of one shard
+    markov_half_life_days: float = 30.0  # counts halve this often; 0 disables decay
+    markov_prune_threshold: float = 0.5  # transitions whose decayed count falls below are dropped
+    markov_max_states: int = 0  # per shard, 0 for unlimited
+    markov_max_bytes: int = 64 * 1024 * 1024  # per shard, 0 for unlimited
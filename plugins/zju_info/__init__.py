@@ -1,7 +1,7 @@
 ###
 from functools import lru_cache
 from nonebot.rule import to_me
-from nonebot.adapters.onebot.v11 import Event, Message, PrivateMessageEvent, MessageSegment
+from nonebot.adapters.onebot.v11 import Event, Message, PrivateMessageEvent
 from nonebot.matcher import Matcher
 from nonebot.params import Arg, CommandArg, ArgPlainText, EventMessage
 from nonebot.plugin import on_command
@@ -18,7 +18,13 @@ import zju_fetcher as fetchers
 from math import ceil
 from zju_fetcher.school_fetcher import Exam
 from utils import qq_image
-from utils.image_utils import random_str
+from utils.image_utils import CardEncoding
+from utils.card_send import send_card
+from nonebot import get_driver
+
+from .config import Config
+
+config = Config.parse_obj(get_driver().config)
 
 PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -28,7 +34,7 @@ MAX_NAME_LEN = 8
 
 ACCOUNT_JSON_FILE = os.path.join(PLUGIN_DIR, 'accounts.json')
 print("ACCOUNT_JSON_FILE=", ACCOUNT_JSON_FILE)
-IMAGE_TMP_PATH = "/tmp"
+CARD_ENCODING = CardEncoding(config.exam_card_format, config.exam_card_max_width, config.exam_card_quality)
 
 gpa = on_command("GPA", rule=lambda: True, aliases={"看看绩点", "gpa"})
 chalaoshi = on_command("chalaoshi", rule=lambda: True, aliases={"查老师"})
@@ -260,13 +266,8 @@ async def handle_exam(matcher: Matcher, event: Event, arg: Message = CommandArg(
             'days_left': get_days_left(exam)
         } for exam in iter if (not is_only_incoming) or is_incoming(exam)]
         
-        image = qq_image.handlers['exam'](sorted(arg_dicts, key=lambda x: comp_key(x['exam']), reverse=False), last_update = up_time)
-        image_path = f"{IMAGE_TMP_PATH}/tmp_{random_str(6)}.png"
-        try:
-            image.save(image_path) #TODO: using a context manager to delete tmp file
-            await matcher.send(MessageSegment.image("file://" + image_path))
-        finally:
-            os.remove(image_path)
+        await send_card(matcher, 'exam', sorted(arg_dicts, key=lambda x: comp_key(x['exam']), reverse=False),
+                        last_update = up_time, encoding=CARD_ENCODING)
         return
         
     msg = "考试列表："
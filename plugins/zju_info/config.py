@@ -3,3 +3,7 @@ from pydantic import BaseModel, Extra
 
 class Config(BaseModel, extra=Extra.ignore):
     """Plugin Config Here"""
+    # Exam lists are sent as png (lossless), png8 (palette), jpeg or webp
+    exam_card_format: str = "png8"
+    exam_card_max_width: int = 1280  # px, wider cards are scaled down first
+    exam_card_quality: int = 85  # jpeg and webp
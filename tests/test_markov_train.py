@@ -0,0 +1,18 @@
+import os
+
+from utils.markov.model import Markov
+from utils.markov.train import train
+
+
+def test_train_into_missing_shard_dir(tmp_path):
+    export = tmp_path / "chat.txt"
+    export.write_text("2024-01-01 12:00:00 someone\n今天天气很好\n"
+                      "2024-01-01 12:01:00 someone\n今天天气不错\n", encoding="utf-8")
+    shard_dir = str(tmp_path / "shards" / "12345")
+
+    machine = train(shard_dir, [str(export)], gram=2, workers=1)
+
+    assert os.path.exists(os.path.join(shard_dir, "meta.json"))
+    assert len(machine.table) > 1
+    reloaded = Markov(shard_dir, gram=2)
+    assert len(reloaded.vocab) == len(machine.vocab)
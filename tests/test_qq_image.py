@@ -0,0 +1,22 @@
+import pytest
+
+pytest.importorskip("zju_fetcher")  # libs/fetcher_for_zjuer, imported by qq_image
+from utils import qq_image  # noqa: E402
+
+
+def test_unknown_rank_gets_blank_logo():
+    info = {"global": {"rank": {"rankName": "Unranked", "rankImg": None}}}
+
+    logo = qq_image.apex_rank_logo(info, (500, 470))
+
+    assert logo.size == (500, 470)
+    assert logo.getbbox() is None  # fully transparent
+
+
+def test_missing_rank_logo_asset_gets_blank_logo():
+    info = {"global": {"rank": {"rankImg": "https://example.com/ranks/notarank4.png"}}}
+
+    logo = qq_image.apex_rank_logo(info, (500, 470))
+
+    assert logo.size == (500, 470)
+    assert logo.getbbox() is None
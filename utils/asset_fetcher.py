@@ -0,0 +1,70 @@
+import asyncio
+import os
+import tempfile
+from io import BytesIO
+
+import aiohttp
+from PIL import Image
+
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=30, sock_connect=10, sock_read=20)
+
+
+class AssetFetcher(object):
+    """Downloads remote images into local files, never twice at the same time.
+
+    One keep-alive session (at most `limit` connections) is shared by every fetch and
+    opened on first use. Concurrent fetches of the same path wait for the same download;
+    a file only appears once it is complete and decodes as an image.
+    """
+
+    def __init__(self, timeout: aiohttp.ClientTimeout = DEFAULT_TIMEOUT, limit: int = 8):
+        self.timeout = timeout
+        self.limit = limit
+        self.session: aiohttp.ClientSession | None = None
+        self.inflight: dict[str, asyncio.Future] = {}
+
+    def _session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=self.timeout,
+                                                 connector=aiohttp.TCPConnector(limit=self.limit))
+        return self.session
+
+    async def fetch(self, url: str, path: str) -> bool:
+        """Make sure `path` exists, downloading it from `url` if needed. False on failure."""
+        if os.path.exists(path):
+            return True
+        future = self.inflight.get(path)
+        if future is None:
+            future = self.inflight[path] = asyncio.ensure_future(self._download(url, path))
+            future.add_done_callback(lambda _: self.inflight.pop(path, None))
+        return await asyncio.shield(future)
+
+    async def _download(self, url: str, path: str) -> bool:
+        try:
+            async with self._session().get(url) as response:
+                response.raise_for_status()
+                content = await response.read()
+            Image.open(BytesIO(content)).verify()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(content)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            return True
+        except Exception as e:
+            print(f"WARN: error occured when fetching '{url}': {e!r}")
+            return False
+
+    async def fetch_all(self, items: list[tuple[str, str]]) -> int:
+        """Fetch `(url, path)` pairs concurrently, return how many are available."""
+        results = await asyncio.gather(*(self.fetch(url, path) for url, path in items))
+        return sum(results)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
@@ -0,0 +1,18 @@
+from nonebot.adapters.onebot.v11 import MessageSegment
+from nonebot.matcher import Matcher
+
+from .image_utils import CardEncoding
+from .render_pool import render_pool, RenderFailed
+
+
+async def send_card(matcher: Matcher, handler: str, *args, encoding: CardEncoding = CardEncoding(),
+                    failure: str = "图片生成失败，稍后再试试吧", **kwargs):
+    """Render a `qq_image` card in the render pool and send it straight from memory.
+    If rendering fails, finish `matcher` with `failure` instead.
+    """
+    try:
+        image = await render_pool.render(handler, *args, encoding=encoding, **kwargs)
+    except RenderFailed as e:
+        print(f"WARN: {e}")
+        await matcher.finish(failure)
+    await matcher.send(MessageSegment.image(image))  # bytes go out as base64://, no temp file
@@ -0,0 +1,3 @@
+# Sample-based speech (活字印刷) used by plugins/electronic_stick
+from .bank import SampleBank, SAMPLE_RATE
+from .assemble import assemble
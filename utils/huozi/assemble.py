@@ -0,0 +1,42 @@
+import numpy as np
+
+
+def assemble(pieces: list[np.ndarray | int], crossfade: int = 0, gap: int = 0, min_frames: int = 0) -> np.ndarray:
+    """Lay out int16 clips (arrays) and silences (frame counts) in one preallocated buffer.
+
+    Consecutive clips are separated by `gap` silent frames, or, without a gap, overlap
+    by up to `crossfade` frames with a linear crossfade. The result is padded with
+    silence to at least `min_frames`. The layout is computed before any sample is
+    copied, so the cost is linear in the output length.
+    """
+    starts, fades = [], []
+    length = 0
+    previous_clip = None
+    for piece in pieces:
+        if isinstance(piece, np.ndarray):
+            fade = 0
+            if previous_clip is not None:
+                if gap:
+                    length += gap
+                elif crossfade:
+                    fade = min(crossfade, len(previous_clip), len(piece))
+            starts.append(length - fade)
+            fades.append(fade)
+            length += len(piece) - fade
+            previous_clip = piece
+        else:
+            starts.append(length)
+            fades.append(0)
+            length += int(piece)
+            previous_clip = None
+
+    out = np.zeros(max(length, min_frames), dtype=np.int16)
+    for piece, start, fade in zip(pieces, starts, fades):
+        if not isinstance(piece, np.ndarray):
+            continue  # already silent
+        if fade:
+            ramp = np.linspace(0.0, 1.0, fade + 2, dtype=np.float32)[1:-1]
+            mixed = out[start:start + fade] * (1 - ramp) + piece[:fade] * ramp
+            out[start:start + fade] = np.clip(np.round(mixed), -32768, 32767)
+        out[start + fade:start + len(piece)] = piece[fade:]
+    return out
@@ -0,0 +1,107 @@
+import os
+import threading
+import wave
+
+import numpy as np
+
+SAMPLE_RATE = 44100
+
+
+def read_wav(path: str) -> tuple[np.ndarray, int]:
+    """Samples of a PCM WAV as float32 in [-1, 1], shape (frames, channels), and its rate."""
+    try:
+        with wave.open(path, "rb") as f:
+            channels, width, rate = f.getnchannels(), f.getsampwidth(), f.getframerate()
+            raw = f.readframes(f.getnframes())
+    except wave.Error:  # WAVE_FORMAT_EXTENSIBLE and friends, which pydub still parses
+        from pydub import AudioSegment
+        segment = AudioSegment.from_wav(path)
+        channels, width, rate = segment.channels, segment.sample_width, segment.frame_rate
+        raw = segment.raw_data
+    if width == 3:
+        triplets = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+        samples = (triplets[:, 0].astype(np.int32) << 8 | triplets[:, 1].astype(np.int32) << 16 |
+                   triplets[:, 2].astype(np.int32) << 24) >> 8
+        scale = 2 ** 23
+    elif width == 1:
+        samples, scale = np.frombuffer(raw, dtype=np.uint8).astype(np.int32) - 128, 2 ** 7
+    else:
+        dtype = {2: np.int16, 4: np.int32}[width]
+        samples, scale = np.frombuffer(raw, dtype=dtype), 2 ** (8 * width - 1)
+    return (samples.astype(np.float32) / scale).reshape(-1, channels), rate
+
+
+def normalize(samples: np.ndarray, rate: int, sample_rate: int) -> np.ndarray:
+    """Downmix to mono, resample linearly to `sample_rate` and convert to int16."""
+    mono = samples.mean(axis=1)
+    if rate != sample_rate and len(mono):
+        frames = int(round(len(mono) * sample_rate / rate))
+        mono = np.interp(np.arange(frames) * (rate / sample_rate), np.arange(len(mono)), mono)
+    return np.clip(np.round(mono * 32767), -32768, 32767).astype(np.int16)
+
+
+class SampleBank(object):
+    """Every WAV of a directory, decoded once into one mono int16 buffer.
+
+    Clips are addressed by file name without extension (`bank["ni"]`) or by the id
+    `bank.id("ni")`; both return views into the shared buffer. The directory is read
+    on first use, or up front with `load`.
+    """
+
+    def __init__(self, directory: str, sample_rate: int = SAMPLE_RATE):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.names: dict[str, int] = {}
+        self.samples = np.zeros(0, dtype=np.int16)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def load(self) -> "SampleBank":
+        with self.lock:
+            if self.loaded:
+                return self
+            clips = []
+            for file in sorted(os.listdir(self.directory)):
+                name, ext = os.path.splitext(file)
+                if ext.lower() != ".wav":
+                    continue
+                try:
+                    clips.append((name, normalize(*read_wav(os.path.join(self.directory, file)),
+                                                  self.sample_rate)))
+                except Exception as e:
+                    print(f"WARN: failed to decode sample '{file}': {e}")
+            self.names = {name: id for id, (name, _) in enumerate(clips)}
+            self.offsets = np.zeros(len(clips) + 1, dtype=np.int64)
+            np.cumsum([len(clip) for _, clip in clips], out=self.offsets[1:])
+            self.samples = np.concatenate([clip for _, clip in clips]) if clips else self.samples
+            self.loaded = True
+        return self
+
+    def id(self, name: str) -> int | None:
+        if not self.loaded:
+            self.load()
+        return self.names.get(name)
+
+    def clip(self, id: int) -> np.ndarray:
+        if not self.loaded:
+            self.load()
+        return self.samples[self.offsets[id]:self.offsets[id + 1]]
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        id = self.id(name)
+        if id is None:
+            raise KeyError(name)
+        return self.clip(id)
+
+    def __contains__(self, name: str) -> bool:
+        return self.id(name) is not None
+
+    def frames(self, ms: float) -> int:
+        return int(self.sample_rate * ms / 1000)
+
+    def silence(self, ms: float) -> np.ndarray:
+        return np.zeros(self.frames(ms), dtype=np.int16)
+
+    def nbytes(self) -> int:
+        return self.samples.nbytes
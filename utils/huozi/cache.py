@@ -0,0 +1,95 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+def clip_key(*parts) -> str:
+    return hashlib.blake2b(repr(parts).encode("utf8"), digest_size=16).hexdigest()
+
+
+class ClipCache(object):
+    """Encoded clips by key, LRU-evicted once they exceed `max_bytes` in memory.
+
+    With `disk_dir`, clips are also written there as `<key>.clip` and served from disk
+    after leaving memory (or after a restart); the least recently used files go once
+    the directory exceeds `disk_max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int, disk_dir: str | None = None, disk_max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.clips: OrderedDict[str, bytes] = OrderedDict()
+        self.nbytes = 0
+        self.lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.clip")
+
+    def get_memory(self, key: str) -> bytes | None:
+        """Memory tier only, cheap enough to call on the event loop."""
+        with self.lock:
+            data = self.clips.get(key)
+            if data is not None:
+                self.clips.move_to_end(key)
+            return data
+
+    def get(self, key: str) -> bytes | None:
+        data = self.get_memory(key)
+        if data is not None or not self.disk_dir:
+            return data
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                data = f.read()
+            os.utime(self._disk_path(key))
+        except FileNotFoundError:
+            return None
+        self._remember(key, data)
+        return data
+
+    def put(self, key: str, data: bytes):
+        self._remember(key, data)
+        if self.disk_dir:
+            try:
+                tmp_path = self._disk_path(key) + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, self._disk_path(key))
+                self._trim_disk()
+            except OSError as e:
+                print(f"WARN: failed to write clip cache '{key}': {e}")
+
+    def _remember(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.clips.pop(key, None)
+            if previous is not None:
+                self.nbytes -= len(previous)
+            self.clips[key] = data
+            self.nbytes += len(data)
+            while self.nbytes > self.max_bytes:
+                _, evicted = self.clips.popitem(last=False)
+                self.nbytes -= len(evicted)
+
+    def _trim_disk(self):
+        entries = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith(".clip"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def __len__(self) -> int:
+        return len(self.clips)
@@ -0,0 +1,82 @@
+import io
+import shutil
+import wave
+
+import numpy as np
+
+# pydub exports through ffmpeg; format -> (ffmpeg format, codec)
+FFMPEG_FORMATS = {
+    "ogg": ("ogg", "libopus"),
+    "opus": ("opus", "libopus"),
+    "mp3": ("mp3", None),
+    "amr": ("amr", "libopencore_amrnb"),
+}
+AMR_RATE = 8000  # AMR-NB only exists at this rate
+
+
+def resample(samples: np.ndarray, rate: int, output_rate: int) -> np.ndarray:
+    """Linearly resampled mono int16 samples."""
+    if rate == output_rate or not len(samples):
+        return samples
+    frames = int(round(len(samples) * output_rate / rate))
+    resampled = np.interp(np.arange(frames) * (rate / output_rate), np.arange(len(samples)), samples)
+    return np.round(resampled).astype(np.int16)
+
+
+def encode_wav(samples: np.ndarray, rate: int) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(samples.astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+def encode_silk(samples: np.ndarray, rate: int, bitrate: int) -> bytes:
+    import pysilk  # optional, `pip install silk-python`
+    output = io.BytesIO()
+    pysilk.encode(io.BytesIO(samples.astype("<i2").tobytes()), output, rate, bitrate, tencent=True)
+    return output.getvalue()
+
+
+def encode_ffmpeg(samples: np.ndarray, rate: int, format: str, bitrate: int) -> bytes:
+    from pydub import AudioSegment
+    ffmpeg_format, codec = FFMPEG_FORMATS[format]
+    segment = AudioSegment(samples.astype("<i2").tobytes(), sample_width=2, frame_rate=rate, channels=1)
+    buffer = io.BytesIO()
+    segment.export(buffer, format=ffmpeg_format, codec=codec, bitrate=f"{bitrate // 1000}k")
+    return buffer.getvalue()
+
+
+def encoder_available(format: str) -> bool:
+    if format == "wav":
+        return True
+    if format == "silk":
+        try:
+            import pysilk  # noqa: F401
+            return True
+        except ImportError:
+            return False
+    return format in FFMPEG_FORMATS and shutil.which("ffmpeg") is not None
+
+
+def encode(samples: np.ndarray, rate: int, format: str = "wav", output_rate: int | None = None,
+           bitrate: int = 32000) -> tuple[bytes, str]:
+    """Mono int16 `samples` encoded in memory, and the format actually used.
+
+    `format` is one of wav, silk (needs pysilk), ogg/opus, mp3 or amr (need ffmpeg); if
+    its encoder is missing (see `encoder_available`) or fails, the clip falls back to
+    WAV. `output_rate` resamples first (AMR is always 8 kHz), `bitrate` in bits/s
+    applies to compressed formats.
+    """
+    output_rate = AMR_RATE if format == "amr" else output_rate or rate
+    samples = resample(samples, rate, output_rate)
+    if format != "wav" and encoder_available(format):
+        try:
+            if format == "silk":
+                return encode_silk(samples, output_rate, bitrate), format
+            return encode_ffmpeg(samples, output_rate, format, bitrate), format
+        except Exception as e:
+            print(f"WARN: failed to encode {format}, sending wav instead: {e}")
+    return encode_wav(samples, output_rate), "wav"
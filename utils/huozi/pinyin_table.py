@@ -0,0 +1,101 @@
+"""Character -> syllable table, so text is read without pypinyin.
+
+    python -m utils.huozi.pinyin_table plugins/electronic_stick/sources plugins/electronic_stick/pinyin_table.json
+
+The build step keeps the default (toneless) reading of every character whose syllable
+has a sample in the given directory, and every pypinyin phrase that reads some of its
+characters differently (as long as those readings have samples too), with its reading.
+Text is read by taking the longest such phrase at each position, and the per-character
+reading everywhere else.
+"""
+import argparse
+import json
+import os
+
+TABLE_VERSION = 2
+
+
+class PinyinTable(object):
+    def __init__(self, chars: dict[str, str] | None = None, phrases: dict[str, list[str]] | None = None):
+        self.chars = chars or {}
+        self.phrases = phrases or {}
+        self.phrase_lengths = sorted({len(phrase) for phrase in self.phrases}, reverse=True)
+
+    def read(self, text: str) -> list[str]:
+        """Syllables of `text`; characters without a known syllable are left out."""
+        if not self.chars:
+            import pypinyin
+            return pypinyin.lazy_pinyin(text)
+        syllables = []
+        i = 0
+        while i < len(text):
+            for length in self.phrase_lengths:
+                reading = self.phrases.get(text[i:i+length])
+                if reading is not None:
+                    syllables += reading
+                    i += length
+                    break
+            else:
+                if text[i] in self.chars:
+                    syllables.append(self.chars[text[i]])
+                i += 1
+        return syllables
+
+    def save(self, path: str):
+        by_syllable: dict[str, list[str]] = {}
+        for char, syllable in self.chars.items():
+            by_syllable.setdefault(syllable, []).append(char)
+        with open(path, "w", encoding="utf8") as f:
+            json.dump({"version": TABLE_VERSION,
+                       "syllables": {syllable: "".join(chars) for syllable, chars in sorted(by_syllable.items())},
+                       "phrases": {phrase: " ".join(reading) for phrase, reading in sorted(self.phrases.items())}},
+                      f, ensure_ascii=False, indent=0)
+
+    @classmethod
+    def load(cls, path: str) -> "PinyinTable":
+        """The table at `path`, or an empty one (everything read by pypinyin) if there is none."""
+        try:
+            with open(path, "r", encoding="utf8") as f:
+                table = json.load(f)
+        except FileNotFoundError:
+            print(f"WARN: no pinyin table at '{path}', reading everything with pypinyin")
+            return cls()
+        if table.get("version") != TABLE_VERSION:
+            print(f"WARN: pinyin table '{path}' has version {table.get('version')}, ignoring it")
+            return cls()
+        chars = {char: syllable for syllable, chars in table["syllables"].items() for char in chars}
+        phrases = {phrase: reading.split(" ") for phrase, reading in table["phrases"].items()}
+        return cls(chars, phrases)
+
+    @classmethod
+    def build(cls, syllables: set[str]) -> "PinyinTable":
+        import pypinyin
+        from pypinyin.phrases_dict import phrases_dict
+        from pypinyin.pinyin_dict import pinyin_dict
+
+        defaults = {chr(code): pypinyin.lazy_pinyin(chr(code))[0] for code in pinyin_dict}
+        phrases = {}
+        for phrase in phrases_dict:
+            reading = pypinyin.lazy_pinyin(phrase)
+            if len(reading) != len(phrase):
+                continue
+            overrides = [syllable for char, syllable in zip(phrase, reading) if defaults.get(char) != syllable]
+            if overrides and all(syllable in syllables for syllable in overrides):
+                phrases[phrase] = reading
+        chars = {char: syllable for char, syllable in defaults.items() if syllable in syllables}
+        return cls(chars, phrases)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the character -> syllable table of a sample directory.")
+    parser.add_argument("sources", help="directory of <syllable>.wav samples")
+    parser.add_argument("output", help="where to write the JSON table")
+    args = parser.parse_args()
+    syllables = {os.path.splitext(name)[0] for name in os.listdir(args.sources) if name.lower().endswith(".wav")}
+    table = PinyinTable.build(syllables)
+    table.save(args.output)
+    print(f"{len(table.chars)} characters over {len(syllables)} syllables, {len(table.phrases)} phrase readings")
+
+
+if __name__ == "__main__":
+    main()
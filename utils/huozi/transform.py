@@ -0,0 +1,63 @@
+import re
+
+PHRASE = "phrase"  # a clip of the phrase bank; the empty name is a pause
+TEXT = "text"  # a run of text still to be read out syllable by syllable
+
+PHRASE_PATTERN = re.compile(r"^\$(.*)\$$")
+
+
+class PhraseMatcher(object):
+    """Rewrites text in one left-to-right pass, always taking the longest rule that matches.
+
+    `rules` maps a pattern to either `$name$` (play phrase `name`, `$$` for a pause) or
+    replacement text. `tokens` returns `(PHRASE, name)` and `(TEXT, text)` pairs, where
+    adjacent text (replaced or not) is merged so it can be read with context. Since rules
+    are looked up in a character trie, a short rule can never break up a longer one.
+    """
+
+    def __init__(self, rules: dict[str, str]):
+        self.trie: dict = {}
+        self.longest = 0
+        for pattern, replacement in rules.items():
+            if not pattern:
+                continue
+            node = self.trie
+            for char in pattern:
+                node = node.setdefault(char, {})
+            match = PHRASE_PATTERN.match(replacement)
+            node[None] = (PHRASE, match.group(1)) if match else (TEXT, replacement)
+            self.longest = max(self.longest, len(pattern))
+
+    def match(self, text: str, start: int) -> tuple[int, tuple[str, str] | None]:
+        """Length and replacement of the longest rule matching at `start`."""
+        node, length, found = self.trie, 0, None
+        for i in range(start, min(len(text), start + self.longest)):
+            node = node.get(text[i])
+            if node is None:
+                break
+            if None in node:
+                length, found = i - start + 1, node[None]
+        return length, found
+
+    def tokens(self, text: str) -> list[tuple[str, str]]:
+        tokens: list[tuple[str, str]] = []
+        run: list[str] = []
+        i = 0
+        while i < len(text):
+            length, found = self.match(text, i)
+            if found is None:
+                run.append(text[i])
+                i += 1
+                continue
+            kind, value = found
+            if kind == TEXT:
+                run.append(value)
+            else:
+                if run:
+                    tokens.append((TEXT, "".join(run)))
+                    run = []
+                tokens.append((PHRASE, value))
+            i += length
+        if run:
+            tokens.append((TEXT, "".join(run)))
+        return tokens
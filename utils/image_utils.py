@@ -1,19 +1,24 @@
+from collections import OrderedDict
 from copy import copy
-from functools import lru_cache
+from functools import lru_cache, wraps
 from io import BytesIO
-import random
-import string
+import re
+import threading
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
 import os
 import numpy as np
 from dataclasses import dataclass, astuple
 
-import requests
+from .asset_fetcher import AssetFetcher
 
 FONTS_PATH = os.path.join(".", "assets", "fonts")
 IMAGES_PATH = os.path.join(".", "assets", "images")
 LEGEND_AVATARS_PATH = os.path.join(IMAGES_PATH, "legends")
 RANK_LOGOS_PATH = os.path.join(IMAGES_PATH, "ranks")
+LEGEND_AVATAR_URL = "https://apexlegendsstatus.com/assets/legends-select/{}.png"
+RANK_LOGO_URL = "https://api.mozambiquehe.re/assets/ranks/{}.png"
+# Missing avatars and logos are downloaded here, before rendering (renderers only read local files)
+asset_fetcher = AssetFetcher()
 
 # Colors (RGBA):
 TRANSPARENT = (255, 255, 255, 0)
@@ -51,35 +56,98 @@ class Pos:
     x: int | float = 0
     y: int | float = 0
 
-def fetch_image(name: str, path_template: str, remote_template: str, type: str = "Unknown"):
-    """If not found, try to fetch from the remote website."""
-    local_image_path = path_template.format(name)
-    if os.path.exists(local_image_path):
-        return Image.open(local_image_path).convert('RGBA')
+class ImageCache:
+    """Decoded images keyed by (path, mode, size, fit), LRU-evicted beyond `max_bytes` of pixels.
+
+    Cached images are shared: callers must copy before drawing on one.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.images: OrderedDict[tuple, Image.Image] = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def image_bytes(image: Image.Image) -> int:
+        return image.width * image.height * len(image.getbands())
+
+    def get(self, path: str, mode: str = 'RGBA', size: tuple[int, int] | None = None,
+            fit: str = "cover") -> Image.Image:
+        """`path` decoded and converted to `mode`, then fitted into `size` if one is given."""
+        def load():
+            with Image.open(path) as raw:
+                image = raw.convert(mode)
+            return image_fit(image, size, fit) if size else image
+        return self.get_or_build((path, mode, size, fit if size else None), load)
+
+    def get_or_build(self, key: tuple, build) -> Image.Image:
+        """The image cached as `key`, or the one `build()` returns, which is cached from then on."""
+        with self.lock:
+            image = self.images.get(key)
+            if image is not None:
+                self.images.move_to_end(key)
+                self.hits += 1
+                return image
+            self.misses += 1
+        image = build()
+        with self.lock:
+            if key not in self.images and self.image_bytes(image) <= self.max_bytes:
+                self.images[key] = image
+                self.nbytes += self.image_bytes(image)
+                while self.nbytes > self.max_bytes:
+                    _, evicted = self.images.popitem(last=False)
+                    self.nbytes -= self.image_bytes(evicted)
+        return image
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "images": len(self.images), "bytes": self.nbytes}
+
+
+# Static assets (avatars, logos, flowers) are decoded once per process
+image_cache = ImageCache()
+# Pre-composited static layers of the cards, see `static_layer`
+layer_cache = ImageCache(96 * 1024 * 1024)
+
+
+def static_layer(func):
+    """Cache the image `func` draws per arguments (which must be hashable) in `layer_cache`.
+    Every call returns a fresh copy, ready for the dynamic parts to be drawn on.
+    """
+    @wraps(func)
+    def wrapped(*args):
+        return layer_cache.get_or_build((func.__qualname__,) + args, lambda: func(*args)).copy()
+    return wrapped
+
+
+def open_asset(local_image_path: str, type: str = "Unknown", size: tuple[int, int] | None = None,
+               fit: str = "cover") -> Image.Image:
+    """Cached RGBA asset (fitted into `size` if given), or an empty image if it was never fetched."""
     try:
-        image_url = remote_template.format(name)
-        response = requests.get(image_url)
-        image_avatar = Image.open(BytesIO(response.content))
-        image_avatar.save(local_image_path)
-    except Exception as e:
-        print(f"WARN: error occured when fetching {type} of '{name}': ")
-        print(e)
-        return Image.new('RGBA', (0,0))
-    
-    return Image.open(local_image_path).convert('RGBA')
-
-def get_legend_avatar(name: str):
-    name = name.lower()
-    local_image_tplt = os.path.join(LEGEND_AVATARS_PATH, "{}.png")
-    image_url = "https://apexlegendsstatus.com/assets/legends-select/{}.png"
-    return fetch_image(name, local_image_tplt, image_url, type = "legend avatar")
-
-def get_rank_logo(name: str):
-    name = name.lower()
-    local_image_tplt = os.path.join(RANK_LOGOS_PATH, "{}.png")
-    image_tplt = "https://api.mozambiquehe.re/assets/ranks/{}.png"
-    
-    return fetch_image(name, local_image_tplt, image_tplt, type = "rank logo")
+        return image_cache.get(local_image_path, 'RGBA', size, fit)
+    except FileNotFoundError:
+        print(f"WARN: {type} '{local_image_path}' is missing, fetch it before rendering")
+        return Image.new('RGBA', size or (0, 0), TRANSPARENT)
+
+def legend_avatar_path(name: str) -> str:
+    return os.path.join(LEGEND_AVATARS_PATH, f"{name.lower()}.png")
+
+def rank_logo_path(name: str) -> str:
+    return os.path.join(RANK_LOGOS_PATH, f"{name.lower()}.png")
+
+async def fetch_legend_avatar(name: str) -> bool:
+    return await asset_fetcher.fetch(LEGEND_AVATAR_URL.format(name.lower()), legend_avatar_path(name))
+
+async def fetch_rank_logo(name: str) -> bool:
+    return await asset_fetcher.fetch(RANK_LOGO_URL.format(name.lower()), rank_logo_path(name))
+
+def get_legend_avatar(name: str, size: tuple[int, int] | None = None, fit: str = "cover"):
+    return open_asset(legend_avatar_path(name), "legend avatar", size, fit)
+
+def get_rank_logo(name: str, size: tuple[int, int] | None = None, fit: str = "contain"):
+    return open_asset(rank_logo_path(name), "rank logo", size, fit)
 
     
 def get_gradient_2d(start, stop, width, height, is_horizontal=True):
@@ -102,10 +170,35 @@ def get_gradient_3d(width, height, start_list, stop_list, is_horizontal_list):
     return result
 
 
+@lru_cache(maxsize=64)
+def shape_mask(shape: str, size: tuple[int, int], radius: int | float = 0, border: int | float = 0,
+               blur: int | float = 0) -> Image.Image:
+    """Anti-aliased 'L' mask of a shape filling `size`: "ellipse" or "rounded" (rectangle with
+    corner `radius`). With `border`, only an outline that wide, inside the shape.
+    Drawn 3x supersampled once per arguments; shared, so only paste through it.
+    """
+    SUPERSAMPLE = 3
+    bigsize = (size[0] * SUPERSAMPLE, size[1] * SUPERSAMPLE)
+    mask = Image.new('L', bigsize, 0)
+    fill, outline = (None, 255) if border else (255, None)
+    width = round(border * SUPERSAMPLE)
+    if shape == "ellipse":
+        ImageDraw.Draw(mask).ellipse((0, 0) + bigsize, fill, outline, width)
+    elif shape == "rounded":
+        ImageDraw.Draw(mask).rounded_rectangle((0, 0, bigsize[0] - 1, bigsize[1] - 1),
+                                               round(radius * SUPERSAMPLE), fill, outline, width)
+    else:
+        raise ValueError(f"Invalid or unsupported shape {shape}.")
+    mask = mask.resize(size, Image.LANCZOS)  # High quality
+    return mask if not blur else mask.filter(ImageFilter.GaussianBlur(blur))
+
+
 def draw_rounded_rectangle(image: Image.Image | ImageDraw.ImageDraw, pos: tuple[Pos, Pos] | tuple[float | int, float | int, float | int, float | int],
                            fill=TRANSPARENT, r: int | float = 0, border=False, border_color=TRANSPARENT,
                            border_width=1):
-    """pos can be (x1,y1,x2,y2) or (Pos(x1,y1),Pos(x2,y2))"""
+    """pos can be (x1,y1,x2,y2) or (Pos(x1,y1),Pos(x2,y2))
+    Rounded corners and the border are pasted through cached `shape_mask`s.
+    """
     draw = image if isinstance(
         image, ImageDraw.ImageDraw) else ImageDraw.Draw(image)
 
@@ -119,25 +212,17 @@ def draw_rounded_rectangle(image: Image.Image | ImageDraw.ImageDraw, pos: tuple[
     assert isinstance(x2, (int, float))
     assert isinstance(y2, (int, float))
 
-    draw.ellipse((x1, y1, x1+2*r, y1+2*r), fill=fill)
-    draw.ellipse((x2-2*r, y1, x2, y1+2*r), fill=fill)
-    draw.ellipse((x1, y2-2*r, x1+2*r, y2), fill=fill)
-    draw.ellipse((x2-2*r, y2-2*r, x2, y2), fill=fill)
-    draw.rectangle((x1+r, y1, x2-r, y2), fill=fill)
-    draw.rectangle((x1, y1+r, x2, y2-r), fill=fill)
+    if not r and not border:
+        draw.rectangle((x1, y1, x2, y2), fill=fill)
+        return
+    # Like draw.rectangle, both corners are inside
+    x1, y1, x2, y2 = round(x1), round(y1), round(x2), round(y2)
+    size = (x2 - x1 + 1, y2 - y1 + 1)
+    if size[0] <= 0 or size[1] <= 0:
+        return
+    draw.bitmap((x1, y1), shape_mask("rounded", size, r), fill=fill)
     if border:
-        draw.arc((x1, y1, x1+2*r, y1+2*r), 180,
-                 270, border_color, border_width)
-        draw.arc((x2-2*r, y1, x2, y1+2*r), 270,
-                 360, border_color, border_width)
-        draw.arc((x1, y2-2*r, x1+2*r, y2), 90,
-                 180, border_color, border_width)
-        draw.arc((x2-2*r, y2-2*r, x2, y2), 0,
-                 90, border_color, border_width)
-        draw.line((x1, y1+r, x1, y2-r), border_color, border_width)
-        draw.line((x2, y1+r, x2, y2-r), border_color, border_width)
-        draw.line((x1+r, y1, x2-r, y1), border_color, border_width)
-        draw.line((x1+r, y2, x2-r, y2), border_color, border_width)
+        draw.bitmap((x1, y1), shape_mask("rounded", size, r, border_width), fill=border_color)
 
 
 @lru_cache
@@ -145,6 +230,120 @@ def sized_font(font=ZPIX, fontsize=24):
     return ImageFont.truetype(font, fontsize)
 
 
+# Kinsoku: characters that may not begin a line, and characters that may not end one
+NO_LINE_START = set(")]}）］｝〕〉》」』】〙〗〟’”»、。，．,.:;：；!?！？‼⁇⁈⁉・ー—～…‥ゝゞヽヾ々〻"
+                    "ぁぃぅぇぉっゃゅょゎゕゖァィゥェォッャュョヮヵヶㇰㇱㇲㇳㇴㇵㇶㇷㇸㇹㇺㇻㇼㇽㇾㇿ%‰℃")
+NO_LINE_END = set("([{（［｛〔〈《「『【〘〖〝‘“«")
+# Line break units: a run of spaces, a Latin (or any non-CJK) word, or a single other character
+BREAK_UNIT = re.compile(r"\s+|[^\s\u2e80-\uffff]+|.")
+
+
+@dataclass(frozen=True)
+class TextRun:
+    x: float
+    y: float
+    text: str
+    width: float
+
+
+@dataclass(frozen=True)
+class TextLayout:
+    """Lines of a text as runs relative to the upper left corner, see `layout_text`."""
+    runs: tuple[TextRun, ...]
+    font: str
+    fontsize: int
+    language: str
+    height: float
+
+
+@lru_cache(maxsize=None)
+def glyph_advances(font: str, fontsize: int, language: str) -> dict[str, float]:
+    """Advance of every character measured so far, in one font and size."""
+    return {}
+
+
+def text_advance(text: str, font=ZPIX, fontsize=12, language="zh-Hans") -> float:
+    """Width of `text` as the sum of its cached glyph advances (no kerning)."""
+    advances = glyph_advances(font, fontsize, language)
+    width = 0
+    for char in text:
+        advance = advances.get(char)
+        if advance is None:
+            advance = advances[char] = sized_font(font, fontsize).getlength(char, language=language)
+        width += advance
+    return width
+
+
+@lru_cache(maxsize=4096)
+def text_length(text: str, font=ZPIX, fontsize=12, language="zh-Hans") -> float:
+    """Exact (shaped, kerned) width of `text`, measured once per distinct string."""
+    return sized_font(font, fontsize).getlength(text, language=language)
+
+
+def break_lines(text: str, width: float, font=ZPIX, fontsize=12, language="zh-Hans") -> list[str]:
+    """Greedily fill lines of at most `width` px. Latin words are kept whole (unless longer
+    than a line), CJK breaks between any characters, and kinsoku characters stay with
+    their neighbour. Spaces at the end of a line and at the start of a wrapped one are dropped.
+    """
+    units = []
+    glue = False  # the last unit ends with a character that cannot end a line
+    for unit in BREAK_UNIT.findall(text):
+        if units and not unit.isspace() and (glue or unit[0] in NO_LINE_START):
+            units[-1] += unit
+        else:
+            units.append(unit)
+        glue = unit[-1] in NO_LINE_END
+
+    lines, line, line_width = [], "", 0
+
+    def place(piece: str, piece_width: float):
+        nonlocal line, line_width
+        if line.strip() and line_width + piece_width > width:
+            lines.append(line.rstrip())
+            line, line_width = "", 0
+            if piece.isspace():
+                return
+        line += piece
+        line_width += piece_width
+
+    for unit in units:
+        unit_width = text_advance(unit, font, fontsize, language)
+        if unit_width > width and not unit.isspace():  # too long for any line, cut anywhere
+            for char in unit:
+                place(char, text_advance(char, font, fontsize, language))
+        else:
+            place(unit, unit_width)
+    if line.strip() or not lines:
+        lines.append(line.rstrip())
+    return lines
+
+
+@lru_cache(maxsize=512)
+def layout_text(text: str, font=ZPIX, fontsize=12, width=300, line_gap=0, seg_gap=0,
+                language="zh-Hans") -> TextLayout:
+    """`text` broken into lines of at most `width` px, each paragraph ("\\n") followed by
+    `seg_gap` instead of `line_gap`. Cached per arguments: draw it with `draw_text_layout`.
+    """
+    runs = []
+    y = 0
+    for segment in text.split("\n"):
+        if segment:
+            for line in break_lines(segment, width, font, fontsize, language):
+                runs.append(TextRun(0, y, line, text_length(line, font, fontsize, language)))
+                y += fontsize + line_gap
+        y += seg_gap - line_gap
+    return TextLayout(tuple(runs), font, fontsize, language, y)
+
+
+def draw_text_layout(draw: ImageDraw.ImageDraw, pos: Pos, layout: TextLayout, color=(0, 0, 0),
+                     is_right2left=False):
+    """Lines start at `pos` (or end there, right to left)."""
+    font = sized_font(layout.font, layout.fontsize)
+    for run in layout.runs:
+        x = pos.x + run.x - (run.width if is_right2left else 0)
+        draw.text((x, pos.y + run.y), run.text, color, font=font, language=layout.language)
+
+
 def text_with_pos_updated(draw: ImageDraw.ImageDraw, pos: Pos, text: str = "", font=ZPIX,
                           fontsize=12, color=(0, 0, 0),
                           is_right2left=False,
@@ -153,8 +352,7 @@ def text_with_pos_updated(draw: ImageDraw.ImageDraw, pos: Pos, text: str = "", f
     """NOTE: pos will be directly changed
     if aligned, then the pos provided is considered to be centralized, and will NOT updated
     """
-    txtlen = draw.textlength(text, font=sized_font(
-        font, fontsize), language=language)
+    txtlen = text_length(text, font, fontsize, language)
     draw_pos = copy(pos)
     if is_right2left:
         draw_pos.x -= txtlen
@@ -171,25 +369,10 @@ def text_with_pos_updated(draw: ImageDraw.ImageDraw, pos: Pos, text: str = "", f
 
 def multiline_text_with_pos_updated(draw: ImageDraw.ImageDraw, pos: Pos, text="", font=ZPIX,
                                     fontsize=12, color=(0, 0, 0), width=300, line_gap=0, seg_gap=0, language="zh-Hans", is_right2left=False):
-    # TODO: take kerning into consideration
-    # TODO: avoid symbols appearing at the beginning of a line
-    single_width = draw.textlength("ああ",
-                                   font=sized_font(font, fontsize)) - draw.textlength("あ", font=sized_font(font, fontsize))
-    max_per_line = max(int(width // single_width), 1)
-
-    def splitn(s, n):
-        for i in range(0, len(s), n):
-            yield s[i:i+n]
-    text = text.split("\n")
-    text = [splitn(s, max_per_line) for s in text]
-    # print(max_per_line, list(text))
-    for segment in text:
-        for line in segment:
-            draw_pos = copy(pos)
-            text_with_pos_updated(draw, draw_pos, line,
-                                  font, fontsize, color, language=language, is_right2left=is_right2left)
-            pos.y += fontsize + line_gap
-        pos.y += seg_gap - line_gap
+    """NOTE: pos.y is moved below the text, see `layout_text`"""
+    layout = layout_text(text, font, fontsize, width, line_gap, seg_gap, language)
+    draw_text_layout(draw, pos, layout, color, is_right2left)
+    pos.y += layout.height
 
 
 def image_fit(image: Image.Image, size: tuple[int, int], mode="cover", filling=TRANSPARENT):
@@ -216,14 +399,38 @@ def image_fit(image: Image.Image, size: tuple[int, int], mode="cover", filling=T
     return canva
 
 
-def get_circle_mask(size: tuple[int, int], blur_radius: int = 0) -> Image.Image:
-    bigsize = (size[0] * 3, size[1] * 3)
-    mask = Image.new('L', bigsize, 0)
-    ImageDraw.Draw(mask).ellipse((0, 0) + bigsize, fill=255)
-    mask = mask.resize(size, Image.LANCZOS)  # High quality
-    return mask if not blur_radius else mask.filter(ImageFilter.GaussianBlur(blur_radius))
+@dataclass(frozen=True)
+class CardEncoding:
+    """How a finished card is sent, see `encode_card`."""
+    format: str = "png"  # png, png8 (palette), jpeg or webp
+    max_width: int | None = None  # wider cards are scaled down to this
+    quality: int = 85  # jpeg and webp
+
 
-def random_str(length):
-    """Generate random a string consists with a-zA-z0-9 with a given length"""
-    letters = string.ascii_lowercase + string.ascii_uppercase + string.digits
-    return ''.join(random.choice(letters) for _ in range(length))
\ No newline at end of file
+def encode_card(image: Image.Image, encoding: CardEncoding = CardEncoding(), background=WHITE) -> bytes:
+    """`image` encoded in memory. JPEG and WebP are flattened onto `background`, png8 is
+    quantized to 256 colors (alpha kept) and optimized, png is lossless as drawn.
+    """
+    if encoding.max_width and image.width > encoding.max_width:
+        height = round(image.height * encoding.max_width / image.width)
+        image = image.resize((encoding.max_width, height), Image.LANCZOS)
+    buffer = BytesIO()
+    if encoding.format in ("jpeg", "webp"):
+        if image.mode == "RGBA":
+            flat = Image.new("RGB", image.size, background[:3])
+            flat.paste(image, (0, 0), image)
+            image = flat
+        image.convert("RGB").save(buffer, format=encoding.format.upper(), quality=encoding.quality,
+                                  optimize=True, **({"method": 4} if encoding.format == "webp" else {}))
+    elif encoding.format == "png8":
+        image.quantize(256, Image.Quantize.FASTOCTREE).save(buffer, format="PNG", optimize=True)
+    elif encoding.format == "png":
+        image.save(buffer, format="PNG")
+    else:
+        raise ValueError(f"Invalid or unsupported format {encoding.format}.")
+    return buffer.getvalue()
+
+
+def get_circle_mask(size: tuple[int, int], blur_radius: int = 0) -> Image.Image:
+    """Cached and shared, see `shape_mask`."""
+    return shape_mask("ellipse", size, blur=blur_radius)
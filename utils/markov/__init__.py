@@ -0,0 +1,6 @@
+# Markov chain text generator used by plugins/markov_learning
+from .model import Markov
+from .shards import ShardManager
+from .vocab import Vocab, BOS, EOS
+from .store import TransitionTable
+from .journal import Journal
@@ -0,0 +1,125 @@
+import asyncio
+import hashlib
+import multiprocessing
+import re
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable
+
+import jieba
+
+
+def init_worker():
+    """Worker initializer: load jieba's dictionary before the first message arrives."""
+    jieba.initialize()  # the bound method itself cannot be pickled for spawned workers
+
+
+def clean_message(plain: str) -> list[str]:
+    """Split a plain-text chat message into sentences, dropping CQ codes and escapes."""
+    plain = re.sub(r"\[.*?\]", "", plain)  # remove CQ Code
+    plain = re.sub(r"&#[0-9]{1,3};", "", plain)  # remove escaped symbols
+    plain = plain.replace("\u3000", "").replace("\r", "")
+    sentences = []
+    for segment in plain.split("\n"):
+        raw_sentences = re.split(r"\.|。|\?|!|？|！", segment, flags=re.UNICODE)
+        for raw_sentence in raw_sentences:
+            if raw_sentence == "" or raw_sentence == " ":
+                continue
+            sentences.append(raw_sentence)
+    return sentences
+
+
+def tokenize_message(plain: str) -> list[list[str]]:
+    return [jieba.lcut(sentence) for sentence in clean_message(plain)]
+
+
+def tokenize_batch(texts: list[str]) -> list[list[list[str]]]:
+    """Worker entry: tokenized sentences of every message."""
+    return [tokenize_message(text) for text in texts]
+
+
+def tokenize_words(text: str) -> list[str]:
+    """Worker entry: tokens of a single query, such as the seed of a generation."""
+    return jieba.lcut(text)
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf8"), digest_size=16).digest()
+
+
+class Ingestor(object):
+    """Tokenizes incoming messages off the event loop and applies them in batches.
+
+    `submit` waits while `queue_size` messages are pending (backpressure). `run` takes up
+    to `batch_size` queued messages at a time, serves repeats from an LRU token cache, has
+    the rest tokenized by `executor`, then hands each shard key all of its sentences in
+    one `apply(key, sentences)` call, run on `apply_executor` when one is given.
+    """
+
+    def __init__(self, apply: Callable[[str, list[list[str]]], None], executor: Executor | None = None,
+                 queue_size: int = 1000, batch_size: int = 64, cache_size: int = 4096,
+                 apply_executor: Executor | None = None):
+        self.apply = apply
+        self.apply_executor = apply_executor
+        # Spawned: forking a process that already runs threads can deadlock on inherited locks
+        self.executor = executor or ProcessPoolExecutor(max_workers=1, initializer=init_worker,
+                                                        mp_context=multiprocessing.get_context("spawn"))
+        self.queue: asyncio.Queue[tuple[list[str], str]] = asyncio.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.cache: OrderedDict[bytes, list[list[str]]] = OrderedDict()
+
+    async def submit(self, keys: list[str], text: str):
+        await self.queue.put((keys, text))
+
+    async def _next_batch(self) -> list[tuple[list[str], str]]:
+        batch = [await self.queue.get()]
+        while len(batch) < self.batch_size and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def tokenize(self, texts: list[str]) -> list[list[list[str]]]:
+        """Tokenized sentences of `texts`, computing each distinct uncached text once."""
+        hashes = [text_key(text) for text in texts]
+        found: dict[bytes, list[list[str]]] = {}
+        misses: dict[bytes, str] = {}
+        for hash, text in zip(hashes, texts):
+            if hash in self.cache:
+                self.cache.move_to_end(hash)
+                found[hash] = self.cache[hash]
+            else:
+                misses.setdefault(hash, text)
+        if misses:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor, tokenize_batch, list(misses.values()))
+            for hash, sentences in zip(misses.keys(), results):
+                found[hash] = self.cache[hash] = sentences
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return [found[hash] for hash in hashes]
+
+    async def run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                tokenized = await self.tokenize([text for _, text in batch])
+                by_key: dict[str, list[list[str]]] = {}
+                for (keys, _), sentences in zip(batch, tokenized):
+                    for key in keys:
+                        by_key.setdefault(key, []).extend(sentences)
+                for key, sentences in by_key.items():
+                    if not sentences:
+                        continue
+                    if self.apply_executor:
+                        await asyncio.get_running_loop().run_in_executor(
+                            self.apply_executor, self.apply, key, sentences)
+                    else:
+                        self.apply(key, sentences)
+            except Exception as e:
+                print(f"WARN: failed to ingest {len(batch)} messages: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,84 @@
+import json
+import os
+import time
+import uuid
+from typing import Iterator
+
+
+class Journal(object):
+    """Append-only log of transition deltas.
+
+    The first line is a header `{"id": ...}` naming this journal; every other line
+    is a JSON array `[state, next_token, count]`. Deltas are coalesced in memory and
+    appended in batches, so a flush costs O(new transitions) regardless of model size.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 5.0, flush_size: int = 1000):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.pending: dict[tuple[tuple, str], int] = {}
+        self.last_flush = time.monotonic()
+        self.id = self._read_id() or self.rotate()
+
+    def _read_id(self) -> str | None:
+        try:
+            with open(self.path, "r", encoding="utf8") as f:
+                return json.loads(f.readline())["id"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def rotate(self) -> str:
+        """Atomically replace the journal with an empty one under a fresh id."""
+        self.id = uuid.uuid4().hex
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf8") as f:
+            f.write(json.dumps({"id": self.id}) + "\n")
+        os.replace(tmp_path, self.path)
+        self.pending.clear()
+        self.last_flush = time.monotonic()
+        return self.id
+
+    def record(self, state: tuple, token: str, count: int = 1):
+        key = (state, token)
+        self.pending[key] = self.pending.get(key, 0) + count
+
+    def should_flush(self) -> bool:
+        if not self.pending:
+            return False
+        return len(self.pending) >= self.flush_size or \
+            time.monotonic() - self.last_flush >= self.flush_interval
+
+    def flush(self) -> int:
+        """Append pending deltas to disk, return the number of records written."""
+        written = len(self.pending)
+        if written:
+            lines = "".join(json.dumps([list(state), token, count], ensure_ascii=False) + "\n"
+                            for (state, token), count in self.pending.items())
+            with open(self.path, "a", encoding="utf8") as f:
+                f.write(lines)
+            self.pending.clear()
+        self.last_flush = time.monotonic()
+        return written
+
+    def replay(self) -> Iterator[tuple[tuple, str, int]]:
+        """Yield every persisted delta. A torn trailing line (crash mid-write) is skipped."""
+        try:
+            f = open(self.path, "r", encoding="utf8")
+        except OSError:
+            return
+        with f:
+            f.readline()  # header
+            for line in f:
+                try:
+                    state, token, count = json.loads(line)
+                except ValueError:
+                    continue
+                yield tuple(state), token, count
+
+    def size(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
@@ -0,0 +1,347 @@
+import json
+import os
+import pickle
+import shutil
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Mapping, Optional
+
+import numpy as np
+
+from .journal import Journal
+from .store import TransitionTable, coo_arrays, csr_arrays
+from .vocab import Vocab, BOS, EOS, BOS_ID, EOS_ID
+
+SNAPSHOT_VERSION = 2
+META_FILE = "meta.json"
+
+
+def windows(sentence: list, gram: int):
+    """Every `(state, next_token)` pair of a sentence padded for `gram`-token states."""
+    sentence = [*[BOS for _ in range(gram)], *list(sentence), EOS]
+    for i in range(len(sentence) - gram):
+        yield tuple(sentence[i:i+gram]), sentence[i+gram]
+
+
+@dataclass
+class MaintenanceReport:
+    states_before: int = 0
+    states_after: int = 0
+    transitions_before: int = 0
+    transitions_after: int = 0
+    tokens_before: int = 0
+    tokens_after: int = 0
+    bytes_before: int = 0
+    bytes_after: int = 0
+
+    def __str__(self):
+        return f"states {self.states_before}->{self.states_after}, " \
+            f"transitions {self.transitions_before}->{self.transitions_after}, " \
+            f"tokens {self.tokens_before}->{self.tokens_after}, " \
+            f"reclaimed {(self.bytes_before - self.bytes_after) / 1024 / 1024:.1f}MiB"
+
+
+class Markov(object):
+    """Word-level Markov chain over interned tokens.
+
+    Besides the `gram`-token states, counts are kept for every shorter context
+    (`tables[k]` holds k-token states) so that generation can back off instead of
+    giving up when a context was never seen. `reverse[k]` holds the same windows read
+    backwards (state -> predecessor), and the full-order table indexes which states
+    contain each token, so a sentence can be grown in both directions from a keyword.
+
+    The snapshot is a directory holding `meta.json` plus one generation subdirectory with
+    the vocabulary and memory-mapped transition arrays. `update` only touches the in-memory
+    overlay and the journal buffer; call `flush` regularly to append the buffered deltas,
+    and `compact` now and then to fold the overlay into a new generation.
+    """
+
+    def __init__(self, snapshot_dir: str, journal_path: str | None = None, gram: int = 2,
+                 flush_interval: float = 5.0, flush_size: int = 1000, legacy_path: str | None = None):
+        self.gram = gram
+        self.snapshot_dir = snapshot_dir
+        self.generation = 0
+        self.maintained_at = time.time()  # wall clock of the last decay, persisted in meta.json
+        self.vocab = Vocab()
+        self.tables = {order: TransitionTable(order, order == gram) for order in range(1, gram + 1)}
+        self.reverse = {order: TransitionTable(order) for order in range(1, gram + 1)}
+        self.last_compact = time.monotonic()
+
+        folded_journal = self._load_snapshot()
+        if folded_journal is None and legacy_path:
+            self._load_pickle(legacy_path)
+        self.journal = Journal(journal_path or snapshot_dir.rstrip(os.sep) + ".journal",
+                               flush_interval, flush_size)
+        if self.journal.id != folded_journal:
+            for state, token, count in self.journal.replay():
+                self.increase(state, token, count)
+
+        bos_state = tuple([BOS_ID for _ in range(self.gram)])
+        if self.table.sample(bos_state) is None:  # an empty model still has to terminate
+            self.increase(tuple([BOS for _ in range(self.gram)]), EOS)
+
+    def _generation_dir(self, generation: int) -> str:
+        return os.path.join(self.snapshot_dir, f"{generation:08d}")
+
+    def _load_snapshot(self) -> str | None:
+        """Map the current generation, return the id of the journal already folded into it."""
+        try:
+            with open(os.path.join(self.snapshot_dir, META_FILE), "r", encoding="utf8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+        if meta.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported markov snapshot version {meta.get('version')}")
+        if meta["gram"] != self.gram:
+            raise ValueError(f"Markov snapshot '{self.snapshot_dir}' has gram={meta['gram']}, "
+                             f"but gram={self.gram} was requested")
+        self.generation = meta["generation"]
+        self.maintained_at = meta.get("maintained_at", self.maintained_at)
+        directory = self._generation_dir(self.generation)
+        self.vocab = Vocab.load(os.path.join(directory, "vocab.json"))
+        self._load_tables(directory)
+        return meta["journal"]
+
+    def _load_tables(self, directory: str):
+        self.tables = {self.gram: TransitionTable.load(
+            os.path.join(directory, f"forward{self.gram}"), self.gram, indexed=True)}
+        self.reverse = {self.gram: TransitionTable.load(os.path.join(directory, f"reverse{self.gram}"), self.gram)}
+        for order in range(1, self.gram):
+            self.tables[order] = TransitionTable.load(os.path.join(directory, f"forward{order}"), order)
+            self.reverse[order] = TransitionTable.load(os.path.join(directory, f"reverse{order}"), order)
+
+    @property
+    def table(self) -> TransitionTable:
+        return self.tables[self.gram]
+
+    def _load_pickle(self, path: str):
+        """Import the pickled `{state: {token: count}}` dict written by older versions."""
+        try:
+            with open(path, "rb") as f:
+                trans = pickle.load(file=f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"WARN: could not load markov snapshot '{path}': {e}")
+            return
+        for state, row in trans.items():
+            if len(state) != self.gram:
+                print(f"WARN: skipped legacy markov snapshot '{path}' with a different gram")
+                return
+            for token, count in row.items():
+                self.increase(state, token, count)
+
+    def increase(self, key: tuple, value: str, count: int = 1):
+        state = tuple(self.vocab.intern(token) for token in key)
+        value_id = self.vocab.intern(value)
+        reverse_state = (value_id, *state[:0:-1])
+        for order in range(1, self.gram + 1):
+            self.tables[order].add(state[self.gram - order:], value_id, count)
+            self.reverse[order].add(reverse_state[self.gram - order:], state[0], count)
+
+    def windows(self, sentence: list):
+        return windows(sentence, self.gram)
+
+    def update(self, sentence: list):
+        for key, value in self.windows(sentence):
+            self.increase(key, value)
+            self.journal.record(key, value)
+        if self.journal.should_flush():
+            self.flush()
+
+    def update_batch(self, sentences: list[list]):
+        """Learn many sentences at once, touching each distinct transition once."""
+        counts = Counter(window for sentence in sentences for window in self.windows(sentence))
+        for (key, value), count in counts.items():
+            self.increase(key, value, count)
+            self.journal.record(key, value, count)
+        if self.journal.should_flush():
+            self.flush()
+
+    def update_counts(self, counts: Mapping[tuple[tuple, str], float]):
+        """Add pre-counted `(state, next_token)` windows and write them as a new generation.
+
+        Meant for bulk training: the counts bypass the journal and the overlay, and
+        every table is rebuilt once from the merged full-order transitions.
+        """
+        n = len(counts)
+        states = np.empty((n, self.gram), dtype=np.uint32)
+        successors = np.empty(n, dtype=np.uint32)
+        values = np.empty(n, dtype=np.float64)
+        for i, ((key, value), count) in enumerate(counts.items()):
+            states[i] = [self.vocab.intern(token) for token in key]
+            successors[i] = self.vocab.intern(value)
+            values[i] = count
+        old_states, old_successors, old_counts = self.table.merged_arrays()
+        self._rebuild(np.concatenate([old_states, states]), np.concatenate([old_successors, successors]),
+                      np.concatenate([old_counts, values]))
+        self.compact()
+
+    def _rebuild(self, states: np.ndarray, successors: np.ndarray, counts: np.ndarray):
+        """Replace every table by ones derived from full-order COO transitions."""
+        full = TransitionTable.from_arrays(self.gram, csr_arrays(states, successors, counts), indexed=True)
+        reverse = full.reversed()
+        self.tables = {order: full.project(order) for order in range(1, self.gram)}
+        self.tables[self.gram] = full
+        self.reverse = {order: reverse.project(order) for order in range(1, self.gram)}
+        self.reverse[self.gram] = reverse
+
+    def flush(self) -> int:
+        return self.journal.flush()
+
+    def compact(self):
+        """Write the next snapshot generation, map it and start an empty journal."""
+        generation = self.generation + 1
+        directory = self._generation_dir(generation)
+        tmp_dir = directory + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        self.vocab.save(os.path.join(tmp_dir, "vocab.json"))
+        for order in range(1, self.gram + 1):
+            self.tables[order].save(os.path.join(tmp_dir, f"forward{order}"))
+            self.reverse[order].save(os.path.join(tmp_dir, f"reverse{order}"))
+        # Left over if a previous compact died before switching meta.json, which never refers to it
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(tmp_dir, directory)
+
+        meta_path = os.path.join(self.snapshot_dir, META_FILE)
+        with open(meta_path + ".tmp", "w", encoding="utf8") as f:
+            json.dump({"version": SNAPSHOT_VERSION, "gram": self.gram, "generation": generation,
+                       "journal": self.journal.id, "maintained_at": self.maintained_at}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+        # The overlay is part of the snapshot now; a crash before rotating is harmless
+        # because the snapshot remembers which journal it already contains.
+        self.journal.rotate()
+        self._load_tables(directory)
+        for name in os.listdir(self.snapshot_dir):
+            if name != META_FILE and name != os.path.basename(directory):
+                shutil.rmtree(os.path.join(self.snapshot_dir, name), ignore_errors=True)
+        self.generation = generation
+        self.last_compact = time.monotonic()
+
+    def maintain(self, half_life: float = 0.0, threshold: float = 0.0,
+                 max_states: int = 0, max_bytes: int = 0) -> MaintenanceReport:
+        """Decay, prune and shrink the model to its budget, then compact it.
+
+        Counts are multiplied by 0.5 ** (elapsed / `half_life` seconds) since the last
+        maintenance; transitions left below `threshold` are dropped; then only the
+        `max_states` states seen most often survive (`max_bytes` is turned into a state
+        count using the current bytes per state). Every other table is derived again
+        from the pruned full-order one, and tokens nobody refers to leave the vocabulary.
+        """
+        report = MaintenanceReport(len(self.table), 0, self.table.transitions(), 0, len(self.vocab), 0,
+                                   self.nbytes(), 0)
+        now = time.time()
+        decay = 0.5 ** ((now - self.maintained_at) / half_life) if half_life > 0 else 1.0
+        states, successors, counts = self.table.merged_arrays()
+        states, successors, counts = coo_arrays(csr_arrays(states, successors, counts * decay))
+        keep = counts >= threshold
+        states, successors, counts = states[keep], successors[keep], counts[keep]
+
+        if max_bytes > 0 and report.states_before:
+            budget = max(1, int(max_bytes / (report.bytes_before / report.states_before)))
+            max_states = min(max_states, budget) if max_states > 0 else budget
+        if max_states > 0:
+            arrays = csr_arrays(states, successors, counts)
+            totals = arrays["cum_counts"][arrays["offsets"][1:] - 1]
+            if max_states < len(totals):
+                kept_rows = np.zeros(len(totals), dtype=bool)
+                kept_rows[np.argsort(totals, kind="stable")[-max_states:]] = True
+                keep = np.repeat(kept_rows, np.diff(arrays["offsets"]))
+                states, successors, counts = (array[keep] for array in coo_arrays(arrays))
+
+        # Renumber the surviving tokens, keeping BOS and EOS first
+        used = np.union1d(np.union1d(states.reshape(-1), successors), np.array([BOS_ID, EOS_ID], dtype=np.uint32))
+        remap = np.zeros(len(self.vocab), dtype=np.uint32)
+        remap[used] = np.arange(len(used), dtype=np.uint32)
+        self.vocab = Vocab([self.vocab[int(id)] for id in used])
+        self._rebuild(remap[states], remap[successors], counts)
+        self.maintained_at = now
+        self.compact()
+
+        report.states_after = len(self.table)
+        report.transitions_after = self.table.transitions()
+        report.tokens_after = len(self.vocab)
+        report.bytes_after = self.nbytes()
+        return report
+
+    def nbytes(self) -> int:
+        """Approximate resident size, used to budget how many models stay loaded."""
+        return self.vocab.nbytes() + sum(table.nbytes() for table in self.tables.values()) + \
+            sum(table.nbytes() for table in self.reverse.values())
+
+    def should_compact(self, interval: float, journal_bytes: int) -> bool:
+        return self.journal.size() >= journal_bytes or \
+            time.monotonic() - self.last_compact >= interval
+
+    def random_choose_weighted(self, key: tuple):
+        state = tuple(self.vocab.get(token) for token in key)
+        if None in state:
+            return None
+        token = self.table.sample(state)
+        return None if token is None else self.vocab[token]
+
+    def next_token(self, history: list[int], tables: dict[int, TransitionTable] | None = None) -> int | None:
+        """Sample a successor of the longest context of `history` that was ever seen."""
+        tables = tables or self.tables
+        for order in range(min(self.gram, len(history)), 0, -1):
+            token = tables[order].sample(tuple(history[-order:]))
+            if token is not None:
+                return token
+        return None
+
+    def grow(self, history: list[int], stop: int, max_tokens: int, deadline: float,
+             tables: dict[int, TransitionTable] | None = None) -> tuple[list[int], bool]:
+        """Extend `history` in place; return the new ids and whether `stop` ended them."""
+        grown = []
+        for _ in range(max_tokens):
+            if time.monotonic() > deadline:
+                return grown, False
+            token = self.next_token(history, tables)
+            if token is None or token == stop:
+                return grown, True
+            history.append(token)
+            grown.append(token)
+        return grown, False
+
+    def gen(self, ctx: Optional[tuple | list] = None, max_tokens: int = 64, time_budget: float = 1.0) -> str:
+        """Grow a sentence around `ctx` (or a new one) until BOS/EOS, `max_tokens` or `time_budget` seconds.
+
+        A lone known keyword is first widened to a seen state containing it, so that both
+        directions start with full context.
+        """
+        deadline = time.monotonic() + time_budget
+        ctx = list(ctx) if ctx else []
+        ids = [self.vocab.get(token) for token in ctx]
+        if len(ids) == 1 and ids[0] is not None:
+            state = self.table.anchor(ids[0])
+            if state is not None:
+                ids = list(state)
+                ctx = [self.vocab[id] for id in ids if id != BOS_ID]
+
+        # Backwards from the known tokens the context starts with
+        leading = []
+        for id in ids:
+            if id is None:
+                break
+            leading.append(id)
+        head, closed = [], not ctx
+        if leading and leading[0] == BOS_ID:
+            closed = True
+        elif leading:
+            head, closed = self.grow(leading[::-1], BOS_ID, max_tokens // 2, deadline, self.reverse)
+        head.reverse()
+
+        # Forwards from everything known before the end of the context
+        if None in ids:
+            trailing = []
+            for id in reversed(ids):
+                if id is None:
+                    break
+                trailing.append(id)
+            history = trailing[::-1] or [BOS_ID for _ in range(self.gram)]
+        else:
+            history = [*[BOS_ID for _ in range(self.gram) if closed], *head, *ids]
+        tail, _ = self.grow(history, EOS_ID, max_tokens - len(head), deadline)
+        return "".join([*[self.vocab[id] for id in head], *ctx, *[self.vocab[id] for id in tail]])
@@ -0,0 +1,72 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Iterator
+
+from .model import META_FILE, Markov
+
+
+class ShardManager(object):
+    """One Markov model per key, stored as `root/<key>/` plus `root/<key>.journal`.
+
+    Shards are loaded on first use and kept in LRU order; `evict` flushes and drops the
+    least recently used ones while their estimated footprint exceeds `memory_budget`
+    bytes (their overlay survives in the journal and is replayed on reload). Eviction
+    is explicit so that callers holding a shard never write to a dropped one.
+    """
+
+    def __init__(self, root: str, memory_budget: int, **markov_kwargs):
+        self.root = root
+        self.memory_budget = memory_budget
+        self.markov_kwargs = markov_kwargs
+        self.shards: OrderedDict[str, Markov] = OrderedDict()
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def get(self, key: str) -> Markov:
+        shard = self.shards.get(key)
+        if shard is None:
+            shard = self.shards[key] = Markov(self.path(key), **self.markov_kwargs)
+        self.shards.move_to_end(key)
+        return shard
+
+    def keys(self) -> list[str]:
+        """Keys of every shard, loaded or only on disk."""
+        on_disk = {name for name in os.listdir(self.root) if os.path.isdir(self.path(name))}
+        return sorted(on_disk | set(self.shards))
+
+    def maintained_at(self, key: str) -> float:
+        """When the shard was last maintained, read from its metadata if it is not loaded."""
+        shard = self.shards.get(key)
+        if shard is not None:
+            return shard.maintained_at
+        try:
+            with open(os.path.join(self.path(key), META_FILE), "r", encoding="utf8") as f:
+                return json.load(f).get("maintained_at", 0.0)
+        except FileNotFoundError:
+            return time.time()
+
+    def nbytes(self) -> int:
+        return sum(shard.nbytes() for shard in self.shards.values())
+
+    def evict(self) -> list[str]:
+        """Drop least recently used shards until under budget; the newest one always stays."""
+        evicted = []
+        while len(self.shards) > 1 and self.nbytes() > self.memory_budget:
+            key, shard = self.shards.popitem(last=False)
+            shard.flush()
+            evicted.append(key)
+        return evicted
+
+    def __iter__(self) -> Iterator[tuple[str, Markov]]:
+        return iter(list(self.shards.items()))
+
+    def __len__(self) -> int:
+        return len(self.shards)
+
+    def flush(self):
+        for _, shard in self:
+            shard.flush()
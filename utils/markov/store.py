@@ -0,0 +1,237 @@
+import os
+import random
+from bisect import bisect
+from itertools import accumulate
+
+import numpy as np
+
+# Big-endian so that the raw bytes of a state row sort like the tuple of its ids,
+# which lets a whole row be binary-searched as one opaque `np.void` key.
+STATE_DTYPE = np.dtype(">u4")
+# Float so that counts can decay; snapshots written with integer counts still load
+COUNT_DTYPE = np.dtype(np.float32)
+ARRAYS = ("states", "offsets", "successors", "counts", "cum_counts")
+# Inverted index, CSR over token ids: rows of the states that contain each token
+INDEX_ARRAYS = ("index_offsets", "index_rows")
+# Rough CPython cost of an overlay state (tuple + dict) and of one successor entry
+DELTA_STATE_BYTES = 300
+DELTA_TRANSITION_BYTES = 100
+
+
+class TransitionTable(object):
+    """Counts of `state -> next token` for fixed-length states of token ids.
+
+    The bulk of the counts lives in CSR arrays (sorted `states`, row `offsets`,
+    `successors`, `counts` and row-local `cum_counts`) that are memory-mapped from a
+    snapshot. Counts added since then sit in the `delta` overlay until the next `save`.
+
+    An `indexed` table also maps every token id to the states containing it.
+    """
+
+    def __init__(self, order: int, indexed: bool = False):
+        self.order = order
+        self.indexed = indexed
+        self.states = np.zeros((0, order), dtype=STATE_DTYPE)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.successors = np.zeros(0, dtype=np.uint32)
+        self.counts = np.zeros(0, dtype=COUNT_DTYPE)
+        self.cum_counts = np.zeros(0, dtype=np.float64)
+        self.keys = self._void_keys(self.states)
+        self.delta: dict[tuple[int, ...], dict[int, int]] = {}
+        self.delta_transitions = 0
+        self.index_offsets = np.zeros(1, dtype=np.int64)
+        self.index_rows = np.zeros(0, dtype=np.uint32)
+        self.delta_index: dict[int, set[tuple[int, ...]]] = {}
+        # state -> (successors, cumulative weights) of rows the overlay touched
+        self.samplers: dict[tuple[int, ...], tuple[list[int], list[float]]] = {}
+
+    def _void_keys(self, states: np.ndarray) -> np.ndarray:
+        return np.ascontiguousarray(states).view(np.dtype((np.void, 4 * self.order))).reshape(-1)
+
+    def find(self, state: tuple[int, ...]) -> int | None:
+        """Row index of `state` in the CSR arrays."""
+        if not len(self.keys):
+            return None
+        key = np.array(state, dtype=STATE_DTYPE).view(self.keys.dtype)
+        row = int(np.searchsorted(self.keys, key)[0])
+        if row < len(self.keys) and self.keys[row] == key[0]:
+            return row
+        return None
+
+    def add(self, state: tuple[int, ...], token: int, count: int = 1):
+        row = self.delta.get(state)
+        if row is None:
+            row = self.delta[state] = {}
+            if self.indexed:
+                for id in set(state):
+                    self.delta_index.setdefault(id, set()).add(state)
+        if token not in row:
+            self.delta_transitions += 1
+        row[token] = row.get(token, 0) + count
+        self.samplers.pop(state, None)
+
+    def row(self, state: tuple[int, ...]) -> dict[int, float]:
+        """Merged successor counts of a state."""
+        merged = {}
+        i = self.find(state)
+        if i is not None:
+            lo, hi = int(self.offsets[i]), int(self.offsets[i + 1])
+            merged = dict(zip(self.successors[lo:hi].tolist(), self.counts[lo:hi].tolist()))
+        for token, count in self.delta.get(state, {}).items():
+            merged[token] = merged.get(token, 0) + count
+        return merged
+
+    def sample(self, state: tuple[int, ...]) -> int | None:
+        """Draw a successor in O(log fan-out), or None for an unknown state."""
+        if state not in self.delta:
+            i = self.find(state)
+            if i is None:
+                return None
+            lo, hi = int(self.offsets[i]), int(self.offsets[i + 1])
+            cum = self.cum_counts[lo:hi]
+            j = int(np.searchsorted(cum, random.random() * float(cum[-1]), side="right"))
+            return int(self.successors[lo + min(j, hi - lo - 1)])
+        table = self.samplers.get(state)
+        if table is None:
+            merged = self.row(state)
+            table = self.samplers[state] = (list(merged.keys()), list(accumulate(merged.values())))
+        successors, cum_weights = table
+        return successors[bisect(cum_weights, random.random() * cum_weights[-1])]
+
+    def anchor(self, token: int) -> tuple[int, ...] | None:
+        """A random state containing `token`, weighted by how often the state was seen."""
+        rows = np.zeros(0, dtype=np.uint32)
+        if token + 1 < len(self.index_offsets):
+            rows = self.index_rows[int(self.index_offsets[token]):int(self.index_offsets[token + 1])]
+        weights = np.cumsum(self.cum_counts[self.offsets[np.asarray(rows, dtype=np.int64) + 1] - 1],
+                            dtype=np.float64)
+        base_total = float(weights[-1]) if len(weights) else 0.0
+        fresh = [state for state in self.delta_index.get(token, ()) if self.find(state) is None]
+        fresh_weights = list(accumulate(sum(self.delta[state].values()) for state in fresh))
+        total = base_total + (fresh_weights[-1] if fresh_weights else 0)
+        if not total:
+            return None
+        r = random.random() * total
+        if r < base_total:
+            row = int(rows[min(int(np.searchsorted(weights, r, side="right")), len(rows) - 1)])
+            return tuple(int(id) for id in self.states[row])
+        return fresh[min(bisect(fresh_weights, r - base_total), len(fresh) - 1)]
+
+    def __len__(self) -> int:
+        return len(self.states) + sum(1 for state in self.delta if self.find(state) is None)
+
+    def transitions(self) -> int:
+        """Number of (state, successor) pairs, overlay included (pairs already in the base may count twice)."""
+        return len(self.successors) + self.delta_transitions
+
+    def nbytes(self) -> int:
+        """Approximate memory footprint, counting mapped arrays as if fully resident."""
+        return sum(getattr(self, name).nbytes for name in ARRAYS) + \
+            len(self.delta) * DELTA_STATE_BYTES + \
+            self.delta_transitions * DELTA_TRANSITION_BYTES + \
+            self.index_offsets.nbytes + self.index_rows.nbytes
+
+    def merged_arrays(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Base plus overlay as unsorted COO `(states, successors, counts)`."""
+        states, successors, counts = coo_arrays({name: getattr(self, name) for name in ARRAYS})
+        if self.delta:
+            items = [(state, token, count) for state, row in self.delta.items() for token, count in row.items()]
+            states = np.concatenate([states, np.array([item[0] for item in items], dtype=np.uint32)
+                                     .reshape(-1, self.order)])
+            successors = np.concatenate([successors, np.fromiter(
+                (item[1] for item in items), dtype=np.uint32, count=len(items))])
+            counts = np.concatenate([counts, np.fromiter(
+                (item[2] for item in items), dtype=np.float64, count=len(items))])
+        return states, successors, counts
+
+    def csr_arrays(self) -> dict[str, np.ndarray]:
+        arrays = csr_arrays(*self.merged_arrays())
+        if self.indexed:
+            arrays.update(index_arrays(arrays["states"]))
+        return arrays
+
+    def project(self, order: int, indexed: bool = False) -> "TransitionTable":
+        """Table of the shorter states `state[-order:]`, i.e. the same counts with less context."""
+        states, successors, counts = self.merged_arrays()
+        return TransitionTable.from_arrays(order, csr_arrays(states[:, self.order - order:], successors, counts),
+                                           indexed)
+
+    def reversed(self, indexed: bool = False) -> "TransitionTable":
+        """Table of predecessors: window `(s0, ..., sn-1) -> x` becomes `(x, sn-1, ..., s1) -> s0`."""
+        states, successors, counts = self.merged_arrays()
+        reverse_states = np.concatenate([successors[:, None], states[:, :0:-1]], axis=1)
+        return TransitionTable.from_arrays(self.order, csr_arrays(reverse_states, states[:, 0], counts), indexed)
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        arrays = self.csr_arrays()
+        for name in ARRAYS + (INDEX_ARRAYS if self.indexed else ()):
+            np.save(os.path.join(directory, f"{name}.npy"), arrays[name])
+
+    @classmethod
+    def from_arrays(cls, order: int, arrays: dict[str, np.ndarray], indexed: bool = False) -> "TransitionTable":
+        table = cls(order, indexed)
+        for name in ARRAYS:
+            setattr(table, name, arrays[name])
+        table.states = table.states.reshape(-1, order)
+        table.keys = table._void_keys(table.states)
+        if indexed:
+            index = arrays if "index_rows" in arrays else index_arrays(table.states)
+            table.index_offsets, table.index_rows = index["index_offsets"], index["index_rows"]
+        return table
+
+    @classmethod
+    def load(cls, directory: str, order: int, indexed: bool = False) -> "TransitionTable":
+        """Memory-map a table written by `save`; nothing is copied until a page is touched."""
+        arrays = {}
+        for name in ARRAYS + INDEX_ARRAYS:
+            path = os.path.join(directory, f"{name}.npy")
+            if os.path.exists(path):
+                arrays[name] = np.load(path, mmap_mode="r")
+        return cls.from_arrays(order, arrays, indexed)
+
+
+def coo_arrays(arrays: dict[str, np.ndarray]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Inverse of `csr_arrays`: one `(state, successor, count)` row per transition."""
+    states = np.repeat(np.asarray(arrays["states"], dtype=np.uint32), np.diff(arrays["offsets"]), axis=0)
+    return states, np.asarray(arrays["successors"]), np.asarray(arrays["counts"], dtype=np.float64)
+
+
+def csr_arrays(states: np.ndarray, successors: np.ndarray, counts: np.ndarray) -> dict[str, np.ndarray]:
+    """Sort COO transitions, sum duplicates and lay them out as the arrays of a table."""
+    order = states.shape[1]
+    if not len(successors):
+        return {"states": np.zeros((0, order), dtype=STATE_DTYPE), "offsets": np.zeros(1, dtype=np.int64),
+                "successors": np.zeros(0, dtype=np.uint32), "counts": np.zeros(0, dtype=COUNT_DTYPE),
+                "cum_counts": np.zeros(0, dtype=np.float64)}
+
+    # primary key: states[:, 0], ..., then the successor
+    perm = np.lexsort((successors, *states.T[::-1]))
+    states, successors, counts = states[perm], successors[perm], counts[perm]
+    new_state = np.ones(len(successors), dtype=bool)
+    new_state[1:] = (states[1:] != states[:-1]).any(axis=1)
+    new_pair = new_state.copy()
+    new_pair[1:] |= successors[1:] != successors[:-1]
+    pair_starts = np.flatnonzero(new_pair)
+    counts = np.add.reduceat(counts.astype(np.float64), pair_starts)
+    states, successors = states[pair_starts], successors[pair_starts]
+    row_starts = np.flatnonzero(new_state[pair_starts])
+
+    offsets = np.append(row_starts, len(successors)).astype(np.int64)
+    cum_counts = np.cumsum(counts)
+    cum_counts -= np.repeat(cum_counts[row_starts] - counts[row_starts], np.diff(offsets))
+    return {"states": states[row_starts].astype(STATE_DTYPE), "offsets": offsets,
+            "successors": successors.astype(np.uint32), "counts": counts.astype(COUNT_DTYPE),
+            "cum_counts": cum_counts}
+
+
+def index_arrays(states: np.ndarray) -> dict[str, np.ndarray]:
+    """Inverted index of sorted `states`: for token t, the rows `index_rows[index_offsets[t]:index_offsets[t+1]]`."""
+    order = states.shape[1]
+    tokens = np.asarray(states, dtype=np.uint64).reshape(-1)
+    rows = np.repeat(np.arange(len(states), dtype=np.uint64), order)
+    pairs = np.unique(tokens << np.uint64(32) | rows)  # a token repeated within one state counts once
+    tokens = pairs >> np.uint64(32)
+    max_token = int(tokens[-1]) if len(tokens) else -1
+    return {"index_offsets": np.searchsorted(tokens, np.arange(max_token + 2, dtype=np.uint64)).astype(np.int64),
+            "index_rows": (pairs & np.uint64(0xFFFFFFFF)).astype(np.uint32)}
@@ -0,0 +1,128 @@
+"""Bootstrap a Markov shard from chat-history exports.
+
+    python -m utils.markov.train plugins/markov_learning/shards/<group_id> chat.txt more.json
+
+Text exports are QQ's "消息记录" files (a `YYYY-MM-DD HH:MM:SS sender` line before each
+message); JSON exports are a list, or one object per line, of messages whose text is in
+`content`, `text`, `message` or `raw_message`. Messages are cleaned exactly like live
+group messages, tokenized and counted on every core, and the per-chunk counts are summed
+and written as a new generation of the shard (existing counts are kept). Stop the bot
+first: it does not expect its shards to change underneath it.
+"""
+import argparse
+import json
+import os
+import re
+import time
+from collections import Counter
+from itertools import islice
+from multiprocessing import Pool
+from typing import Iterable, Iterator
+
+import jieba
+
+from .ingest import tokenize_message
+from .model import Markov, windows
+
+TXT_HEADER = re.compile(r"^\d{4}-\d{2}-\d{2} \d{1,2}:\d{2}:\d{2} .+$")
+JSON_TEXT_FIELDS = ("content", "text", "message", "raw_message")
+
+
+def read_txt(path: str) -> Iterator[str]:
+    message: list[str] | None = None  # None until the first header
+    with open(path, "r", encoding="utf-8-sig", errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if TXT_HEADER.match(line):
+                if message:
+                    yield "\n".join(message)
+                message = []
+            elif message is not None and line:
+                message.append(line)
+    if message:
+        yield "\n".join(message)
+
+
+def json_text(item) -> str | None:
+    if isinstance(item, str):
+        return item
+    if isinstance(item, list):  # OneBot message segments
+        return "".join(segment.get("data", {}).get("text", "") for segment in item
+                       if isinstance(segment, dict) and segment.get("type") == "text")
+    if isinstance(item, dict):
+        for field in JSON_TEXT_FIELDS:
+            if field in item:
+                return json_text(item[field])
+    return None
+
+
+def read_json(path: str) -> Iterator[str]:
+    with open(path, "r", encoding="utf-8-sig") as f:
+        head = f.read(1)
+        while head.isspace():
+            head = f.read(1)
+        f.seek(0)
+        if head == "[":
+            items = json.load(f)
+        else:  # JSON lines
+            items = (json.loads(line) for line in f if line.strip())
+        for item in items:
+            text = json_text(item)
+            if text:
+                yield text
+
+
+def read_messages(paths: Iterable[str]) -> Iterator[str]:
+    for path in paths:
+        reader = read_json if os.path.splitext(path)[1].lower() in (".json", ".jsonl") else read_txt
+        yield from reader(path)
+
+
+def chunked(items: Iterable[str], size: int) -> Iterator[list[str]]:
+    items = iter(items)
+    while chunk := list(islice(items, size)):
+        yield chunk
+
+
+def count_windows(args: tuple[list[str], int]) -> tuple[int, Counter]:
+    """Worker entry: message count and `(state, next_token)` counts of a chunk."""
+    messages, gram = args
+    counts = Counter()
+    for message in messages:
+        for sentence in tokenize_message(message):
+            counts.update(windows(sentence, gram))
+    return len(messages), counts
+
+
+def train(shard_dir: str, paths: list[str], gram: int = 2, workers: int | None = None,
+          chunk_size: int = 2000) -> Markov:
+    started = time.monotonic()
+    machine = Markov(shard_dir, gram=gram)  # before counting, so a bad shard fails fast
+    total = Counter()
+    messages = 0
+    with Pool(workers or os.cpu_count(), initializer=jieba.initialize) as pool:
+        chunks = ((chunk, gram) for chunk in chunked(read_messages(paths), chunk_size))
+        for chunk_messages, counts in pool.imap_unordered(count_windows, chunks):
+            total.update(counts)  # reduce
+            messages += chunk_messages
+            print(f"\rmarkov: counted {messages} messages, {len(total)} distinct windows", end="", flush=True)
+    print()
+    machine.update_counts(total)
+    print(f"markov: wrote {len(total)} windows into '{shard_dir}' "
+          f"({len(machine.table)} states, {len(machine.vocab)} tokens) in {time.monotonic() - started:.1f}s")
+    return machine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train a markov_learning shard from chat-history exports.")
+    parser.add_argument("shard", help="shard directory, e.g. plugins/markov_learning/shards/<group_id>")
+    parser.add_argument("exports", nargs="+", help=".txt, .json or .jsonl chat exports")
+    parser.add_argument("--gram", type=int, default=2, help="must match markov_gram of the bot")
+    parser.add_argument("--workers", type=int, default=None, help="tokenizer processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=2000, help="messages per worker task")
+    args = parser.parse_args()
+    train(args.shard, args.exports, args.gram, args.workers, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import json
+
+TOKEN_BYTES = 120  # rough CPython cost of a token in both the list and the dict
+
+EOS = "<eos>"
+BOS = "<bos>"
+BOS_ID = 0
+EOS_ID = 1
+
+
+class Vocab(object):
+    """Interns tokens to consecutive ints. BOS and EOS always get the first two ids."""
+
+    def __init__(self, tokens: list[str] | None = None):
+        self.tokens: list[str] = list(tokens) if tokens else [BOS, EOS]
+        self.ids: dict[str, int] = {token: i for i, token in enumerate(self.tokens)}
+
+    def intern(self, token: str) -> int:
+        id = self.ids.get(token)
+        if id is None:
+            id = self.ids[token] = len(self.tokens)
+            self.tokens.append(token)
+        return id
+
+    def get(self, token: str) -> int | None:
+        return self.ids.get(token)
+
+    def __getitem__(self, id: int) -> str:
+        return self.tokens[id]
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def nbytes(self) -> int:
+        return len(self.tokens) * TOKEN_BYTES
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf8") as f:
+            json.dump(self.tokens, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> "Vocab":
+        with open(path, "r", encoding="utf8") as f:
+            return cls(json.load(f))
@@ -1,13 +1,10 @@
 from copy import copy
-from math import ceil
-import matplotlib.pyplot as plt
+from math import ceil, floor, log10
 from functools import lru_cache, wraps
 from io import BytesIO
-import io
 import re
 import time
 from PIL import Image, ImageDraw
-import requests
 from zju_fetcher.chalaoshi_fetcher import Teacher
 from zju_fetcher.school_fetcher import Exam, Course
 import os
@@ -35,15 +32,37 @@ def registered_as(name):
     return wrapper
 
 # Image Generators 
+EXAM_CARD_HEIGHT = 400
+EXAM_CARD_WIDTH = 1600
+EXAM_CARD_GAP = 30
+
+
+@static_layer
+def exam_base(count: int) -> Image.Image:
+    """Background, header and the empty cards of an exam list with `count` exams."""
+    height = (EXAM_CARD_HEIGHT + EXAM_CARD_GAP) * count + 130
+    width = EXAM_CARD_WIDTH + 100
+    background = Image.new('RGBA', (width, height), BLACK)
+    draw = ImageDraw.Draw(background)
+    pos = Pos(0, 0)
+    text_with_pos_updated(draw, pos, "試験、襲来", MATISSE_EB,
+                          126, color=WHITE, language="ja")
+    text_with_pos_updated(draw, pos, "仅供参考：请以教务网为准！" + "/" * 20,
+                          SERIF_HEAVY, 56, color=ZJU_RED)
+    pos = Pos(50, 126)
+    for id in range(count):
+        draw_rounded_rectangle(draw, (pos.x, pos.y, pos.x + EXAM_CARD_WIDTH, pos.y + EXAM_CARD_HEIGHT),
+                               SHALLOW_PURPLE if id & 1 else RICE_WHITE, 20, False)
+        pos.y += EXAM_CARD_HEIGHT + EXAM_CARD_GAP
+    return background
+
+
 @registered_as("exam")
 def _get_exam_image(exams: list[dict], last_update: Optional[float] = None):
 
-    def get_exam_card(exam: Exam, days_left='?', bg_color=WHITE, width=2000, height=400) -> Image.Image:
-        image = Image.new('RGBA', (width, height), TRANSPARENT)
-        d = ImageDraw.Draw(image)
-        draw_rounded_rectangle(d, (0, 0, width, height), bg_color, 20, False)
-
-        pos = Pos(50, 50)
+    def draw_exam_card(d: ImageDraw.ImageDraw, origin: Pos, exam: Exam, days_left='?'):
+        """Texts of one exam, on the card whose upper left corner is `origin`."""
+        pos = Pos(origin.x + 50, origin.y + 50)
 
         text_with_pos_updated(d, pos, exam.name if exam.name else "", ZPIX, 54)
         pos.y += 20
@@ -55,7 +74,7 @@ def _get_exam_image(exams: list[dict], last_update: Optional[float] = None):
             d, pos, f"({days_left}天后)", SERIF_HEAVY, 36, ZJU_RED)
 
         # New Line
-        pos = Pos(70, 150)
+        pos = Pos(origin.x + 70, origin.y + 150)
 
         if exam.time_final:
             text_with_pos_updated(
@@ -69,7 +88,7 @@ def _get_exam_image(exams: list[dict], last_update: Optional[float] = None):
             pos.y += 60
 
         # New Line
-        pos.x = 70
+        pos.x = origin.x + 70
         if exam.time_mid:
             text_with_pos_updated(
                 d, pos, f"【期中】{exam.time_mid}", MATISSE_EB, 36)
@@ -81,52 +100,39 @@ def _get_exam_image(exams: list[dict], last_update: Optional[float] = None):
                     d, pos, f"[No.{exam.seat_mid}]", SERIF_HEAVY, 36)
             pos.y += 70
 
-        pos.x = 50
+        pos.x = origin.x + 50
         if exam.remark:
             text_with_pos_updated(
                 d, pos, f"⚠{exam.remark}", SERIF_HEAVY, 36, ZJU_BLUE)
-        return image
 
-    CARD_HEIGHT = 400
-    CARD_WIDTH = 1600
-    CARD_GAP = 30
-    height = (CARD_HEIGHT + CARD_GAP) * len(exams) + 130
-    width = CARD_WIDTH + 100
-    background = Image.new('RGBA', (width, height), BLACK)
+    background = exam_base(len(exams))
     draw = ImageDraw.Draw(background)
-    pos = Pos(0, 0)
-    text_with_pos_updated(draw, pos, "試験、襲来", MATISSE_EB,
-                          126, color=WHITE, language="ja")
-    pos_tmp = copy(pos)
-    text_with_pos_updated(draw, pos, "仅供参考：请以教务网为准！" + "/" * 20,
-                          SERIF_HEAVY, 56, color=ZJU_RED)
-    pos = pos_tmp
-    pos.y += 60
-    if last_update:
+    if last_update:  # below the notice, right after the title
+        pos = Pos(draw.textlength("試験、襲来", font=sized_font(MATISSE_EB, 126), language="ja"), 60)
         text_with_pos_updated(
             draw, pos, f"数据更新于:{datetime.fromtimestamp(last_update)}", SERIF_HEAVY, 40, color=ZJU_RED)
     pos = Pos(50, 126)
-    for id, exam in enumerate(exams):
-        card = get_exam_card(**exam, bg_color=SHALLOW_PURPLE if id &
-                             1 else RICE_WHITE, width=CARD_WIDTH, height=CARD_HEIGHT)
-        background.paste(card, astuple(pos), card)  # with transparency
-        pos.y += CARD_HEIGHT + CARD_GAP
+    for exam in exams:
+        draw_exam_card(draw, pos, **exam)
+        pos.y += EXAM_CARD_HEIGHT + EXAM_CARD_GAP
     return background
 
 
-@registered_as("hanakotoba")
-def _get_hanakotoba_image(image: str, kotobas: list[str], name="", desc=""):
-    WIDTH, HEIGHT = 1920, 1080
-    IMG_W, IMG_H = 1080, 1080
+HNKTB_WIDTH, HNKTB_HEIGHT = 1920, 1080
+HNKTB_IMG_W, HNKTB_IMG_H = 1080, 1080
+HNKTB_PADDING = 50
+HNKTB_CARD_H = 100
+HNKTB_GAP = 15
+
+
+@static_layer
+def hanakotoba_base(image: str, count: int) -> Image.Image:
+    """Background, the fading flower picture and `count` empty kotoba cards."""
     GRAD_W = 512
-    PADDING = 50
-    CARD_H = 100
-    GAP = 15
 
-    bk_ground = Image.new('RGBA', (WIDTH, HEIGHT), SHALLOW_YELLOW)
-    flower = Image.open(image).convert('RGBA')
-    # Left-side flower image with gradient
-    flower = image_fit(flower, (IMG_W, IMG_H))
+    bk_ground = Image.new('RGBA', (HNKTB_WIDTH, HNKTB_HEIGHT), SHALLOW_YELLOW)
+    # Left-side flower image with gradient (copied, the cached one is shared)
+    flower = image_cache.get(image, 'RGBA', (HNKTB_IMG_W, HNKTB_IMG_H)).copy()
 
     grad_array = get_gradient_3d(
         GRAD_W, flower.height, (255, ), (0, ), (True, ))
@@ -140,21 +146,33 @@ def _get_hanakotoba_image(image: str, kotobas: list[str], name="", desc=""):
     bk_ground.paste(flower, (0, 0), flower)
 
     draw = ImageDraw.Draw(bk_ground)
-    pos = Pos(IMG_W - 30, IMG_H - 140)
+    text_w = HNKTB_WIDTH - HNKTB_IMG_W - 2 * HNKTB_PADDING
+    pos = Pos(HNKTB_IMG_W + HNKTB_PADDING, HNKTB_PADDING)
+    for _ in range(count):
+        draw_rounded_rectangle(
+            draw, (pos.x, pos.y, pos.x+text_w+HNKTB_PADDING, pos.y+HNKTB_CARD_H), SHALLOW_RED)
+        pos.y += HNKTB_CARD_H + HNKTB_GAP
+    return bk_ground
+
+
+@registered_as("hanakotoba")
+def _get_hanakotoba_image(image: str, kotobas: list[str], name="", desc=""):
+    bk_ground = hanakotoba_base(image, len(kotobas))
+
+    draw = ImageDraw.Draw(bk_ground)
+    pos = Pos(HNKTB_IMG_W - 30, HNKTB_IMG_H - 140)
     text_with_pos_updated(draw, pos, name, MS_PMINCHO, 108, WHITE, True)
 
-    text_w, text_h = WIDTH - IMG_W - 2 * PADDING, HEIGHT - 2 * PADDING
-    pos = Pos(IMG_W + PADDING, PADDING)
+    text_w = HNKTB_WIDTH - HNKTB_IMG_W - 2 * HNKTB_PADDING
+    pos = Pos(HNKTB_IMG_W + HNKTB_PADDING, HNKTB_PADDING)
     for kotoba in kotobas:
-        draw_rounded_rectangle(
-            draw, (pos.x, pos.y, pos.x+text_w+PADDING, pos.y+CARD_H), SHALLOW_RED)
         txt_pos = copy(pos)
         txt_pos.y += 14
         text_with_pos_updated(
             draw, txt_pos, f"「{kotoba}」", MS_PMINCHO, 72, BLACK, language='ja')
-        pos.y += CARD_H + GAP
+        pos.y += HNKTB_CARD_H + HNKTB_GAP
 
-    pos.y += 2*GAP
+    pos.y += 2*HNKTB_GAP
     multiline_text_with_pos_updated(draw, copy(
         pos), desc, MATISSE_EB, 30, BLACK, text_w, language='ja', line_gap=8, seg_gap=24)
     return bk_ground
@@ -166,83 +184,147 @@ APEX_DIVSCORE = [0, 4000, 8000, 12000, 16000, 20000, 24000]
 APEX_COLORS = ["#484852", "#CD7F32", "#C0C0C0",
                "#FFD700", "#B1F4FA", "#358DE6", "#9F35E6", "#E31B39"]
 
-def plot_progress(rank_scores, height_to_width_ratio):
-    """Example:  
-    rank_scores = [85, 900, 4920, 11095, 10008, 20008, 24091, 30094, 97, 99]  
-    height_to_width_ratio = 0.5  
-    output_filename = "custom_plot.png"  
+def apex_rank_logo_name(info: dict) -> str | None:
+    """Logo name of the player's rank, as in `info["global"]["rank"]["rankImg"]`."""
+    try:
+        return re.search(r"\/([^\/]+)\.png$", info["global"]["rank"]["rankImg"]).group(1)
+    except (KeyError, TypeError, AttributeError):
+        return None
+
+def apex_rank_logo(info: dict, size: tuple[int, int]) -> Image.Image:
+    """The player's rank logo, or an empty one of the same size if the rank is unknown."""
+    name = apex_rank_logo_name(info)
+    if name is None:
+        print("WARN: the player's rank has no logo, leaving it blank")
+        return Image.new('RGBA', size, TRANSPARENT)
+    return get_rank_logo(name, size, "contain")
+
+def apex_rank_logo_names() -> list[str]:
+    """Every rank logo: four divisions per rank, just one for Master and Apex Predator."""
+    names = []
+    for rank in APEX_RANKS:
+        divisions = [1] if rank in APEX_RANKS[-2:] else [1, 2, 3, 4]
+        names += [f"{rank.lower().replace(' ', '')}{division}" for division in divisions]
+    return names
+
+async def prefetch_apex_assets() -> int:
+    """Download every missing legend avatar and rank logo concurrently; returns how many are present."""
+    return await asset_fetcher.fetch_all(
+        [(LEGEND_AVATAR_URL.format(name.lower()), legend_avatar_path(name)) for name in APEX_LEGENDS] +
+        [(RANK_LOGO_URL.format(name), rank_logo_path(name)) for name in apex_rank_logo_names()])
+
+def _nice_step(span: float, max_ticks: int, steps=(1, 2, 2.5, 5)) -> float:
+    """Smallest 1/2/2.5/5 x 10^k step that puts at most `max_ticks` ticks on `span`."""
+    magnitude = 10 ** floor(log10(max(span, 1) / max_ticks))
+    while True:
+        for step in steps:
+            if span / (step * magnitude) <= max_ticks:
+                return step * magnitude
+        magnitude *= 10
+
+
+@lru_cache(maxsize=16)
+def _rank_bands(width: int, height: int, max_y: int) -> Image.Image:
+    """Rank division backdrop of a `max_y`..0 axis: one flat band per division below
+    Master, then 100 steps from Master to Predator color, all at 30% over white.
+    Shared between renders, do not draw on it."""
+    gradient = Color(APEX_COLORS[-2]).range_to(Color(APEX_COLORS[-1]), 100)
+    colors = np.array([Color(color).get_rgb() for color in APEX_COLORS[:-2]] +
+                      [color.get_rgb() for color in gradient]) * 255
+    colors = np.round(colors * 0.3 + 255 * 0.7).astype(np.uint8)
+    edges = np.concatenate((APEX_DIVSCORE, np.linspace(APEX_DIVSCORE[-1], max_y, 101)[1:]))
+    values = max_y * (1 - (np.arange(height) + 0.5) / height)  # row centers, top row first
+    rows = colors[np.clip(np.searchsorted(edges, values, side='right') - 1, 0, len(colors) - 1)]
+    return Image.fromarray(np.ascontiguousarray(np.broadcast_to(rows[:, None, :], (height, width, 3))), 'RGB')
+
+
+def plot_progress(rank_scores, size=(1000, 448)) -> Image.Image:
+    """Rank score line chart over the rank division backdrop, as a transparent RGBA image.
+    Example:
+    rank_scores = [85, 900, 4920, 11095, 10008, 20008, 24091, 30094, 97, 99]
+    size = (1450, 650)
     """
-    # Determine plot y-axis range
-    MAX_Y = max(36000, ceil(max(rank_scores)/1000) * 1000)
-    MIN_Y = 0
-    
-    total_games = list(range(1, len(rank_scores) + 1))
-    
-    # Calculate the figure width based on the desired height-to-width ratio
-    fig_width = 10
-    fig_height = fig_width * height_to_width_ratio
-
-    # Create a figure and axes with the custom size
-    fig, ax1 = plt.subplots(figsize=(fig_width, fig_height), linewidth=2)
-
-    # Plot the line chart with circle markers
-    ax1.plot(total_games, rank_scores, marker='o',
-             linestyle='-', color='#1090FF', linewidth=2)
-
-    ## Set background colors on the y-axis with gradient
-    # < Master
-    for i in range(len(APEX_DIVSCORE) - 1):
-        ax1.axhspan(APEX_DIVSCORE[i], APEX_DIVSCORE[i+1],
-                    facecolor=APEX_COLORS[i], alpha=0.3)
-
-    # Master and Predators
-    red = Color(APEX_COLORS[-2])
-    colors = list(red.range_to(Color(APEX_COLORS[-1]), 100))
-    HEIGHT = MAX_Y - APEX_DIVSCORE[-1]
-    for i, color in enumerate(colors):
-        ax1.axhspan(APEX_DIVSCORE[-1] + i*(HEIGHT/100), APEX_DIVSCORE[-1] +
-                    (i+1)*(HEIGHT/100), facecolor=color.get_rgb(), alpha=0.3)
-
-    ax1.set_ylim(MIN_Y, MAX_Y)
-    ax1.yaxis.set_ticks_position('right')
-    ax1.xaxis.set_ticks_position('bottom')
-    ax1.set_xlabel('Ranked Played')
-    ax1.set_ylabel('Rank Score')
-    
-    # Set transparent background
-    fig.patch.set_alpha(0.0)
-
-    # Set thicker frame borders with the same width
-    ax1.spines['top'].set_linewidth(2)
-    ax1.spines['bottom'].set_linewidth(2)
-    ax1.spines['left'].set_linewidth(2)
-    ax1.spines['right'].set_linewidth(2)
-
-    # Set ticks towards the inside
-    ax1.tick_params(axis='y', direction='in')
-    ax1.tick_params(axis='x', direction='in')
-
-    # Save the plot as a temporary image file
-    # plt.savefig(output_filename, transparent=True)
-    def fig2img(fig):
-        """Convert a Matplotlib figure to a PIL Image and return it"""
-        buf = io.BytesIO()
-        fig.savefig(buf)
-        buf.seek(0)
-        img = Image.open(buf)
-        return img
-    
-    img = fig2img(fig)
-    
-    return img
+    SUPERSAMPLE = 3
+    LINE_COLOR = (16, 144, 255, 255)
+    width, height = size
+    scale = width / 1000  # proportions below are for a 1000px wide chart
+    line_width, marker_r = 2.8 * scale, 4.2 * scale
+    spine_width, tick_len = max(1, round(2.8 * scale)), round(4.9 * scale)
+    font = sized_font(BANK_SANS_EF_SC_REGULAR, round(14 * scale))
+
+    # Axes box and data ranges
+    left, right = round(0.125 * width), round(0.9 * width)
+    top, bottom = round(0.12 * height), round(0.89 * height)
+    max_y = max(36000, ceil(max(rank_scores) / 1000) * 1000)
+    games = len(rank_scores)
+    margin = 0.05 * (games - 1) if games > 1 else 0.5
+    min_x, max_x = 1 - margin, games + margin
+
+    def to_px(x, y):
+        return (left + (x - min_x) / (max_x - min_x) * (right - left),
+                bottom - y / max_y * (bottom - top))
+
+    image = Image.new('RGBA', size, TRANSPARENT)
+    image.paste(_rank_bands(right - left, bottom - top, max_y), (left, top))
+    d = ImageDraw.Draw(image)
 
-def get_foreground(info: dict, desc:str, legends: list|None = None, scores: list|None = None, width=1920, height=1080):
-    """Generate foreground(info layer) of the card.
+    # Line and markers, drawn supersampled and pasted through the downsampled coverage
+    coverage = Image.new('L', (width * SUPERSAMPLE, height * SUPERSAMPLE), 0)
+    cd = ImageDraw.Draw(coverage)
+    points = [tuple(v * SUPERSAMPLE for v in to_px(x, y)) for x, y in enumerate(rank_scores, 1)]
+    if len(points) > 1:
+        cd.line(points, fill=255, width=round(line_width * SUPERSAMPLE), joint="curve")
+    r = marker_r * SUPERSAMPLE
+    for x, y in points:
+        cd.ellipse((x - r, y - r, x + r, y + r), fill=255)
+    coverage = coverage.resize(size, Image.BOX)
+    image.paste(Image.new('RGBA', size, LINE_COLOR), (0, 0), coverage)
+
+    # Frame, inward ticks (y on the right), tick labels and axis labels
+    half = spine_width // 2
+    d.rectangle((left - half, top - half, right + half, bottom + half), outline=BLACK, width=spine_width)
+    tick_width = max(1, round(1.1 * scale))
+    label_gap = round(5 * scale)
+    step = _nice_step(max_x - min_x, 6, (1, 2, 5))
+    for x in np.arange(ceil(min_x / step) * step, max_x, step):
+        px = round(to_px(x, 0)[0])
+        d.line((px, bottom, px, bottom - tick_len), BLACK, tick_width)
+        d.text((px, bottom + spine_width + label_gap), f"{x:g}", BLACK, font=font, anchor="mt")
+    step = _nice_step(max_y, 8)
+    for y in np.arange(0, max_y + 1, step):
+        py = round(to_px(0, y)[1])
+        d.line((right, py, right - tick_len, py), BLACK, tick_width)
+        d.text((right + spine_width + label_gap, py), f"{y:g}", BLACK, font=font, anchor="lm")
+    d.text(((left + right) / 2, height - label_gap), "Ranked Played", BLACK, font=font, anchor="md")
+    label = Image.new('RGBA', (round(font.getlength("Rank Score")) + 2, font.size * 2), TRANSPARENT)
+    ImageDraw.Draw(label).text((1, font.size), "Rank Score", BLACK, font=font, anchor="lm")
+    label = label.rotate(90, expand=True)
+    image.alpha_composite(label, (left - spine_width - label_gap - label.width, (top + bottom - label.height) // 2))
+    return image
+
+def apex_info_valid(info: dict) -> bool:
+    return bool(info) and bool(info.get("global")) and not info.get("Error")
+
+
+@static_layer
+def apex_base(width=1920, height=1080) -> Image.Image:
+    """White card with the labels every player card has, where `draw_foreground` expects them."""
+    image = Image.new('RGBA', (width, height), WHITE)
+    d = ImageDraw.Draw(image)
+    # Below the rank logo, rank name, LP and Top %
+    text_with_pos_updated(d, Pos(80 + 500/2, 320 + 470 + 72 + 20 + 56 + 20 + 36), "(At the moment of the last game)",
+                          font = BANK_SANS_EF_SC_REGULAR, fontsize = 36, is_horaligned=True, color=GRAY)
+    text_with_pos_updated(d, Pos(640, 270), "Rank Progress", font = BANK_SANS_EF_SC_REGULAR, fontsize = 48, color=BLACK)
+    multiline_text_with_pos_updated(d, Pos(670, 900 + 2 * 20), "Season\nMost-Played\nLengeds",
+                                    font = BANK_SANS_EF_SC_REGULAR, fontsize = 36, color=BLACK)
+    return image
+
+
+def draw_foreground(image: Image.Image, info: dict, desc:str, legends: list|None = None, scores: list|None = None):
+    """Draw the player dependent parts (info layer) of the card on `image`, a copy of `apex_base`.
     `info` format is determined by this API: https://apexlegendsapi.com/#query-by-uid
     """
-    if (not info) or (not info.get("global")) or (info.get("Error")):  # Invalid info object structure
-        return None
-    
+    width, height = image.size
     MAX_SIZE = 108
     HUGE_SIZE = 72
     MID_SIZE = 56
@@ -251,7 +333,6 @@ def get_foreground(info: dict, desc:str, legends: list|None = None, scores: list
     
     STD_GAP = 20
 
-    image = Image.new('RGBA', (width, height), TRANSPARENT)
     d = ImageDraw.Draw(image)
 
     
@@ -265,9 +346,7 @@ def get_foreground(info: dict, desc:str, legends: list|None = None, scores: list
     cursor = copy(RANK_IMG_POS)
     
     # Draw rank logo
-    rank_logo_name = re.search(r"\/([^\/]+)\.png$", rank["rankImg"]).group(1)
-    rank_img = get_rank_logo(rank_logo_name)
-    rank_img = image_fit(rank_img.convert("RGBA"), RANK_IMG_SIZE, "contain")
+    rank_img = apex_rank_logo(info, RANK_IMG_SIZE)
     image.paste(rank_img, astuple(RANK_IMG_POS), rank_img)
     
     # Moved to bottom mid point of the logo
@@ -285,8 +364,7 @@ def get_foreground(info: dict, desc:str, legends: list|None = None, scores: list
     # if not is_master_or_pred(rank_name):
     cursor.y += MID_SIZE + STD_GAP
     text_with_pos_updated(d, cursor, f"Top {rank_stop_percent}%", font = BANK_SANS_EF_SC_REGULAR, fontsize = MIN_SIZE, is_horaligned=True, color=ZJU_BLUE)
-    cursor.y += MIN_SIZE
-    text_with_pos_updated(d, cursor, f"(At the moment of the last game)", font = BANK_SANS_EF_SC_REGULAR, fontsize = MIN_SIZE, is_horaligned=True, color=GRAY)
+    # "(At the moment of the last game)" is below, in `apex_base`
     # Top Stop Integer (ranking), only for masters and predators
     if is_master_or_pred(rank_name):
         stop_cursor = copy(BOTTOM_CENTER_CURSOR)
@@ -348,14 +426,11 @@ def get_foreground(info: dict, desc:str, legends: list|None = None, scores: list
     if scores[-1]!=rank_score:
         scores.append(rank_score)
     # Graph Title
-    TITLE_POS = Pos(640, 270)
-    cursor = copy(TITLE_POS)
-    text_with_pos_updated(d, cursor, "Rank Progress", font = BANK_SANS_EF_SC_REGULAR, fontsize = TINY_SIZE, color=BLACK)
+    # Graph title is in `apex_base`
     cursor = Pos(500, 250)
     PROGRESS_W = 1450
     PROGRESS_H = 650
-    progress = plot_progress(scores, PROGRESS_H/PROGRESS_W).convert("RGBA")
-    progress = image_fit(progress, (PROGRESS_W, PROGRESS_H), mode = "cover")
+    progress = plot_progress(scores, (PROGRESS_W, PROGRESS_H))
     image.paste(progress, astuple(cursor) + (cursor.x + PROGRESS_W, cursor.y + PROGRESS_H), mask=progress)
     # draw_rounded_rectangle(d, (cursor, Pos(cursor.x+PROGRESS_W, cursor.y+PROGRESS_H)), 
     #                        fill = TRANSPARENT, 
@@ -367,24 +442,19 @@ def get_foreground(info: dict, desc:str, legends: list|None = None, scores: list
     
     ### Part: Most Played Legends
     # Prompt "Most Played Legends"
-    cursor = Pos(670, 900)
-    LEGENDS_CURSOR = copy(cursor)
-    cursor.y += 2 * STD_GAP
-    multiline_text_with_pos_updated(d, cursor, "Season\nMost-Played\nLengeds", font = BANK_SANS_EF_SC_REGULAR, fontsize = MIN_SIZE, color=BLACK)
+    # (the prompt itself is in `apex_base`)
+    LEGENDS_CURSOR = Pos(670, 900)
     # Legend Avatar & Times Played
     def draw_legend_compose(pos: Pos, radius: int, raw_avatar: Image.Image, frame_color = GRAY):
         """`pos` = Upper Left Position"""
-        cutted_avatar = image_fit(raw_avatar, (radius * 2,radius * 2), mode="cover")
+        cutted_avatar = raw_avatar if raw_avatar.size == (radius * 2, radius * 2) \
+            else image_fit(raw_avatar, (radius * 2,radius * 2), mode="cover")
         mask = get_circle_mask(cutted_avatar.size)
         # Avatar Frame
         FRAME_SIZE = (2*radius, 2*radius)
-        bigsize = (FRAME_SIZE[0] * 3, FRAME_SIZE[1] * 3)
-        frame = Image.new('RGBA', bigsize, TRANSPARENT)
-        ImageDraw.Draw(frame).ellipse((0, 0) + bigsize, fill=TRANSPARENT, outline = frame_color, width = 10)
-        frame = frame.resize(FRAME_SIZE, Image.LANCZOS)  # High quality
         image.paste(cutted_avatar, astuple(pos), mask)
-        # frame.save("./frame.png")
-        image.paste(frame, astuple(pos), frame)
+        image.paste(frame_color, astuple(pos) + (pos.x + FRAME_SIZE[0], pos.y + FRAME_SIZE[1]),
+                    shape_mask("ellipse", FRAME_SIZE, border=10/3))
     
     cursor = copy(LEGENDS_CURSOR)
     cursor.x += 70
@@ -394,26 +464,24 @@ def get_foreground(info: dict, desc:str, legends: list|None = None, scores: list
         
     for legend in legends:
         cursor.x += 180
-        draw_legend_compose(cursor, 80, get_legend_avatar(legend), frame_color=ZJU_BLUE)
+        draw_legend_compose(cursor, 80, get_legend_avatar(legend, (160, 160)), frame_color=ZJU_BLUE)
     
     ### Part: Descriptive Infos (Upper Right)
     cursor = Pos(width - 2 * STD_GAP, STD_GAP)
     multiline_text_with_pos_updated(d, cursor, desc, width = 500, font = SERIF_HEAVY, fontsize = TINY_SIZE, color=BLACK, is_right2left=True)
     
     ### Part: WaterMark
+    # (191,191,191,127) over the white card, drawn opaque: the card is not a separate layer anymore
     cursor = Pos(width - STD_GAP, height - STD_GAP - 2 * MIN_SIZE)
     multiline_text_with_pos_updated(d, cursor, f"Generated by Cubic YYY\n{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())}", width = 1000, 
-                                    font = BANK_SANS_EF_SC_REGULAR, fontsize = MIN_SIZE, color=(191,191,191,127), is_right2left=True)
-
-    return image
+                                    font = BANK_SANS_EF_SC_REGULAR, fontsize = MIN_SIZE, color=(223,223,223,255), is_right2left=True)
 
 
 @registered_as("apex")
 def _get_apex_image(info_dict: dict, legends: list, scores: list):
-    image = Image.new('RGBA', (1920, 1080), WHITE)
-    image_fore = get_foreground(info_dict, "", legends=legends, scores=scores)
-    if image_fore:
-        image.paste(image_fore, None, image_fore)
-        
+    if not apex_info_valid(info_dict):  # Invalid info object structure
+        return Image.new('RGBA', (1920, 1080), WHITE)
+    image = apex_base(1920, 1080)
+    draw_foreground(image, info_dict, "", legends=legends, scores=scores)
     return image
 
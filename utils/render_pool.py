@@ -0,0 +1,111 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from .image_utils import CardEncoding
+
+
+class RenderFailed(Exception):
+    pass
+
+
+class RenderQueueFull(RenderFailed):
+    pass
+
+
+def _warm_worker():
+    """Load everything the card renderers reuse once, before the first job arrives."""
+    from . import qq_image
+    from .image_utils import sized_font, get_legend_avatar, get_rank_logo, get_circle_mask, \
+        ZPIX, MATISSE_EB, SERIF_HEAVY, MS_PMINCHO, BANK_SANS_EF_SCRO, BANK_SANS_EF_SC_REGULAR
+    for font, sizes in ((ZPIX, (36, 54)), (MATISSE_EB, (30, 36, 126)), (SERIF_HEAVY, (36, 40, 48, 56, 72)),
+                        (MS_PMINCHO, (72, 108)), (BANK_SANS_EF_SCRO, (72,)),
+                        (BANK_SANS_EF_SC_REGULAR, (36, 48, 56))):
+        for size in sizes:
+            try:
+                sized_font(font, size)
+            except OSError:  # font not installed, the renderer will complain when it needs it
+                break
+    for legend in qq_image.APEX_LEGENDS:
+        get_legend_avatar(legend, (160, 160))
+    for name in qq_image.apex_rank_logo_names():
+        get_rank_logo(name, (500, 470), "contain")
+    get_circle_mask((160, 160))
+    try:
+        qq_image.apex_base()
+    except Exception as e:  # a worker that failed to warm up still renders, just slower
+        print(f"WARN: failed to prepare the apex card base: {e!r}")
+
+
+def _render(handler: str, args: tuple, kwargs: dict, encoding: CardEncoding) -> bytes:
+    from . import qq_image
+    from .image_utils import encode_card
+    return encode_card(qq_image.handlers[handler](*args, **kwargs), encoding)
+
+
+class RenderPool(object):
+    """Runs `qq_image.handlers` in long-lived worker processes and returns the cards
+    encoded there (PNG unless another `encoding` is given).
+
+    Workers are spawned on first use (or `start`) and warm their fonts and static assets
+    right away. At most `workers + queue_size` renders may be pending; beyond that
+    `render` raises `RenderQueueFull`. A render that exceeds `timeout` seconds or kills
+    its worker raises `RenderFailed` and restarts the whole pool, so the next request
+    gets healthy workers; an exception from the renderer itself is re-raised as
+    `RenderFailed` as well, with the original as its cause.
+    """
+
+    def __init__(self, workers: int = 2, queue_size: int = 8, timeout: float = 30.0):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.pending = 0
+        self.executor: ProcessPoolExecutor | None = None
+
+    def start(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                                initializer=_warm_worker)
+            for _ in range(self.workers):  # start every worker now instead of on demand
+                self.executor.submit(os.getpid)
+
+    def restart(self):
+        executor, self.executor = self.executor, None
+        if executor is not None:
+            # ProcessPoolExecutor cannot cancel running jobs, so stuck workers are killed
+            for process in list(getattr(executor, "_processes", {}).values()):
+                process.terminate()
+            executor.shutdown(wait=False, cancel_futures=True)
+        self.start()
+
+    async def render(self, handler: str, *args, encoding: CardEncoding = CardEncoding(), **kwargs) -> bytes:
+        if self.pending >= self.workers + self.queue_size:
+            raise RenderQueueFull(f"{self.pending} renders pending")
+        self.start()
+        executor = self.executor
+        self.pending += 1
+        try:
+            future = asyncio.get_running_loop().run_in_executor(
+                executor, partial(_render, handler, args, kwargs, encoding))
+            return await asyncio.wait_for(future, self.timeout)
+        except (asyncio.TimeoutError, BrokenProcessPool) as e:
+            if self.executor is executor:  # not already replaced because of another render
+                print(f"WARN: '{handler}' render failed or timed out, restarting render workers")
+                self.restart()
+            raise RenderFailed(f"'{handler}' render failed: {e!r}") from e
+        except Exception as e:  # raised by the renderer itself, the worker is still fine
+            raise RenderFailed(f"'{handler}' render raised {e!r}") from e
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+# Shared by every plugin that renders cards
+render_pool = RenderPool()